@@ -3,9 +3,12 @@ from datetime import datetime, timezone
 
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
 
 from auth import check_auth
 from db import (
+    CHART_COLUMNS,
+    ESTIMATION_COLUMNS,
     ITEM_TYPES,
     STATUSES,
     UNIT_TYPES,
@@ -16,24 +19,42 @@ from db import (
     export_all,
     format_unit_value,
     get_all_checkpoints_for_items,
+    get_checkpoint_notes,
     get_checkpoints,
     get_item,
+    get_item_estimations,
     get_items,
+    get_precomputed,
     import_all,
     init_db,
+    reset_payload_bytes,
     update_checkpoint,
     update_checkpoint_timestamp,
     update_item_status,
     update_item_total,
 )
-from estimation import compute_estimation, format_duration, format_eta, format_speed
-from charts import build_progress_chart
+from estimation import (
+    compute_estimation,
+    compute_eta_quantiles,
+    decode_estimation,
+    estimation_from_row,
+    estimation_row,
+    eta_quantiles_from_rows,
+    format_duration,
+    format_eta,
+    format_eta_range,
+    format_speed,
+)
+from charts import build_progress_chart, chart_from_json
+from snapshot import is_snapshot, read_snapshot, snapshot_bytes
+from ui_state import collect as collect_ui_state, forget, ui_key
 
 # ---- Page config ----
 st.set_page_config(page_title="Learning Tracker", page_icon="\U0001F4DA", layout="wide")
 
 # ---- Init DB ----
 init_db()
+reset_payload_bytes()
 
 # ---- Auth gate ----
 if not check_auth():
@@ -53,6 +74,7 @@ TYPE_COLORS = {
     "course": "green",
 }
 STATUS_LABELS = {"active": "Active", "waitlist": "Waitlist", "abandoned": "Abandoned"}
+CHECKPOINT_PAGE_SIZE = 50
 
 
 def _type_badge(item_type: str) -> str:
@@ -85,6 +107,351 @@ def _format_local_ts(dt_str: str) -> str:
     return local.strftime("%Y-%m-%d %H:%M")
 
 
+# ---- View routing ----
+if "view" not in st.session_state:
+    st.session_state["view"] = "list"
+if "detail_item_id" not in st.session_state:
+    st.session_state["detail_item_id"] = None
+
+
+def go_to_detail(item_id: str):
+    st.session_state["view"] = "detail"
+    st.session_state["detail_item_id"] = item_id
+
+
+def go_to_list():
+    st.session_state["view"] = "list"
+    st.session_state["detail_item_id"] = None
+
+
+# ---- Fragments ----
+# Each view is a fragment that loads the data it shows, so using one of its
+# widgets reruns just that view, and a write inside it is followed by
+# _rerun_fragment() instead of a full rerun (auth, sidebar and the other
+# view are left alone). Reads go through db.py's revision cache, so a rerun
+# after a UI-only interaction (edit toggles, confirmations) makes at most one
+# revision probe. Toggles are set in on_click callbacks, which run before the
+# rerun the click triggers. Only switching views and imports rerun the app.
+
+
+def _set_state(key: str, value):
+    st.session_state[key] = value
+
+
+def _rerun_fragment():
+    """Rerun the calling fragment; a full rerun if it is running as part of one."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+@st.cache_data(ttl=60)
+def _cached_export():
+    return export_all()
+
+
+@st.cache_data(ttl=60)
+def _cached_snapshot():
+    return snapshot_bytes(_cached_export())
+
+
+@st.fragment
+def _sidebar_data():
+    """Export / import controls."""
+    export_data = _cached_export()
+    st.download_button(
+        "Export Data",
+        data=json.dumps(export_data, indent=2, default=str),
+        file_name=f"learning-tracker-{datetime.now().strftime('%Y-%m-%d')}.json",
+        mime="application/json",
+    )
+    st.download_button(
+        "Export Snapshot",
+        data=_cached_snapshot(),
+        file_name=f"learning-tracker-{datetime.now().strftime('%Y-%m-%d')}.ltsnap",
+        mime="application/octet-stream",
+        help="Compact columnar (Arrow IPC, zstd) backup",
+    )
+
+    uploaded = st.file_uploader("Import Data", type=["json", "ltsnap"], key="import_file")
+    if uploaded is not None:
+        try:
+            raw = uploaded.read()
+            data = read_snapshot(raw) if is_snapshot(raw) else json.loads(raw)
+            import_all(data)
+            st.success("Data imported!")
+            st.rerun()
+        except Exception as e:
+            st.error(f"Import failed: {e}")
+
+
+@st.fragment
+def _item_grid(rows: list[dict]):
+    """
+    3-column grid of item cards from item_estimations() rows. A fragment of
+    its own inside _item_list, so "View Details" doesn't reload the rows.
+    """
+    cols = st.columns(3)
+    all_quantiles = eta_quantiles_from_rows(rows)
+    for idx, (item, quantiles) in enumerate(zip(rows, all_quantiles)):
+        est = estimation_from_row(item)
+        with cols[idx % 3]:
+            with st.container(border=True):
+                st.markdown(f"**{item['name']}**")
+                st.caption(_type_badge(item["item_type"]))
+                progress_val = est["percent"] / 100
+                st.progress(min(progress_val, 1.0))
+                unit = item["unit_type"]
+                st.caption(
+                    f"{format_unit_value(est['current'], unit)} / "
+                    f"{format_unit_value(item['total_units'], unit)} {unit} "
+                    f"({est['percent']:.0f}%)"
+                )
+                if est["eta"]:
+                    st.caption(f"ETA: {format_eta(est['eta'])}")
+                else:
+                    st.caption("ETA: ~100 years")
+                if quantiles:
+                    st.caption(f"Likely: {format_eta_range(quantiles)}")
+                if st.button("View Details", key=ui_key("item", item["id"], "detail")):
+                    go_to_detail(item["id"])
+                    st.rerun()
+
+
+def _detail_header(item: dict, est: dict, eta_quantiles: dict | None):
+    """Title, progress, editable total and stats."""
+    item_id = item["id"]
+    unit = item["unit_type"]
+
+    # Header
+    col_h1, col_h2 = st.columns([3, 1])
+    with col_h1:
+        st.title(item["name"])
+    with col_h2:
+        st.markdown(f":{TYPE_COLORS[item['item_type']]}[{_type_badge(item['item_type'])}]")
+        st.markdown(f"**Status:** {STATUS_LABELS[item['status']]}")
+
+    # Progress bar
+    progress_val = est["percent"] / 100
+    st.progress(min(progress_val, 1.0))
+
+    # Editable total units
+    edit_total_key = ui_key("item", item_id, "editing_total")
+    if edit_total_key not in st.session_state:
+        st.session_state[edit_total_key] = False
+
+    if st.session_state[edit_total_key]:
+        et_cols = st.columns([2, 1, 1])
+        with et_cols[0]:
+            new_total = st.number_input(
+                f"Total {unit}",
+                min_value=0.1,
+                step=1.0,
+                value=float(item["total_units"]),
+                key=ui_key("item", item_id, "new_total"),
+            )
+        with et_cols[1]:
+            if st.button("Save", key=ui_key("item", item_id, "save_total")):
+                update_item_total(item_id, new_total)
+                st.session_state[edit_total_key] = False
+                _rerun_fragment()
+        with et_cols[2]:
+            st.button(
+                "Cancel",
+                key=ui_key("item", item_id, "cancel_total"),
+                on_click=_set_state,
+                args=(edit_total_key, False),
+            )
+    else:
+        prog_cols = st.columns([5, 1])
+        with prog_cols[0]:
+            st.caption(
+                f"{format_unit_value(est['current'], unit)} / "
+                f"{format_unit_value(item['total_units'], unit)} {unit} ({est['percent']:.0f}%)"
+            )
+        with prog_cols[1]:
+            st.button(
+                "Edit",
+                key=ui_key("item", item_id, "edit_total"),
+                on_click=_set_state,
+                args=(edit_total_key, True),
+            )
+
+    # Stats
+    stat_cols = st.columns(3)
+    with stat_cols[0]:
+        st.metric("Speed", format_speed(est["speed"], unit))
+    with stat_cols[1]:
+        st.metric("Time Remaining", format_duration(est["hours_remaining"]))
+    with stat_cols[2]:
+        st.metric("Estimated Completion", format_eta(est["eta"]))
+    if eta_quantiles:
+        st.caption(
+            f"Likely completion (P10\u2013P90): {format_eta_range(eta_quantiles)}, "
+            f"median {format_eta(eta_quantiles['p50'])}"
+        )
+
+
+def _detail_chart(
+    item: dict,
+    completed_cps: list[dict],
+    est: dict,
+    eta_quantiles: dict | None,
+    chart: dict | None = None,
+):
+    """Progress chart, from the worker's JSON when given."""
+    st.subheader("Progress Chart")
+    if chart:
+        fig = chart_from_json(chart)
+    else:
+        fig = build_progress_chart(item, completed_cps, est, eta_quantiles)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def _checkpoint_table(item: dict, completed_cps: list[dict], shown: int):
+    """Latest `shown` completed checkpoints with inline edit, refresh and delete."""
+    unit = item["unit_type"]
+    st.subheader("Checkpoints")
+    if not completed_cps:
+        st.info("No checkpoints yet.")
+        return
+
+    if len(completed_cps) > shown:
+        st.button(
+            f"Show older checkpoints ({len(completed_cps) - shown} hidden)",
+            key=ui_key("item", item["id"], "show_older"),
+            on_click=_set_state,
+            args=(ui_key("item", item["id"], "cp_rows"), shown + CHECKPOINT_PAGE_SIZE),
+        )
+
+    for cp in completed_cps[-shown:]:
+        edit_cp_key = ui_key("cp", cp["id"], "editing")
+        if edit_cp_key not in st.session_state:
+            st.session_state[edit_cp_key] = False
+
+        if st.session_state[edit_cp_key]:
+            # Edit mode
+            local_dt = _utc_to_local(cp["timestamp"])
+            ec_cols = st.columns([2, 2, 2, 3, 1, 1])
+            with ec_cols[0]:
+                edit_units = st.number_input(
+                    "Units",
+                    min_value=0.0,
+                    step=1.0,
+                    value=float(cp["units_completed"]),
+                    key=ui_key("cp", cp["id"], "units"),
+                    label_visibility="collapsed",
+                )
+            with ec_cols[1]:
+                edit_date = st.date_input(
+                    "Date",
+                    value=local_dt.date(),
+                    key=ui_key("cp", cp["id"], "date"),
+                    label_visibility="collapsed",
+                )
+            with ec_cols[2]:
+                edit_time = st.time_input(
+                    "Time",
+                    value=local_dt.time(),
+                    key=ui_key("cp", cp["id"], "time"),
+                    label_visibility="collapsed",
+                )
+            with ec_cols[3]:
+                edit_notes = st.text_input(
+                    "Notes",
+                    value=cp.get("notes") or "",
+                    key=ui_key("cp", cp["id"], "notes"),
+                    label_visibility="collapsed",
+                )
+            with ec_cols[4]:
+                if st.button("Save", key=ui_key("cp", cp["id"], "save")):
+                    new_local = datetime.combine(
+                        edit_date, edit_time, tzinfo=_local_tz()
+                    )
+                    new_ts = _local_to_utc(new_local)
+                    update_checkpoint(
+                        cp["id"],
+                        edit_units,
+                        new_ts,
+                        edit_notes or None,
+                    )
+                    st.session_state[edit_cp_key] = False
+                    _rerun_fragment()
+            with ec_cols[5]:
+                st.button(
+                    "Cancel",
+                    key=ui_key("cp", cp["id"], "cancel"),
+                    on_click=_set_state,
+                    args=(edit_cp_key, False),
+                )
+        else:
+            # Display mode
+            cp_cols = st.columns([2, 3, 3, 1, 1, 1])
+            with cp_cols[0]:
+                st.write(f"{format_unit_value(cp['units_completed'], unit)} {unit}")
+            with cp_cols[1]:
+                st.write(_format_local_ts(cp["timestamp"]))
+            with cp_cols[2]:
+                st.write(cp.get("notes") or "")
+            with cp_cols[3]:
+                if st.button(
+                    "\U0001F504", key=ui_key("cp", cp["id"], "refresh"), help="Set to now"
+                ):
+                    update_checkpoint_timestamp(cp["id"])
+                    _rerun_fragment()
+            with cp_cols[4]:
+                st.button(
+                    "Edit",
+                    key=ui_key("cp", cp["id"], "edit"),
+                    on_click=_set_state,
+                    args=(edit_cp_key, True),
+                )
+            with cp_cols[5]:
+                if st.button(
+                    "\U0001F5D1", key=ui_key("cp", cp["id"], "delete"), help="Delete checkpoint"
+                ):
+                    delete_checkpoint(cp["id"])
+                    forget("cp", cp["id"])
+                    _rerun_fragment()
+
+
+def _item_actions(item: dict):
+    """Status change and delete with confirmation."""
+    item_id = item["id"]
+    confirm_key = ui_key("item", item_id, "confirm_delete")
+    action_cols = st.columns([2, 1])
+    with action_cols[0]:
+        current_idx = list(STATUSES).index(item["status"])
+        new_status = st.selectbox(
+            "Change Status",
+            options=list(STATUSES),
+            index=current_idx,
+            format_func=lambda s: STATUS_LABELS[s],
+            key=ui_key("item", item_id, "status_change"),
+        )
+        if new_status != item["status"]:
+            if st.button("Update Status"):
+                update_item_status(item_id, new_status)
+                st.success(f"Status changed to {STATUS_LABELS[new_status]}")
+                _rerun_fragment()
+    with action_cols[1]:
+        st.markdown("&nbsp;", unsafe_allow_html=True)
+        st.button("Delete Item", type="primary", on_click=_set_state, args=(confirm_key, True))
+
+        if st.session_state.get(confirm_key):
+            st.warning("Are you sure? This cannot be undone.")
+            c1, c2 = st.columns(2)
+            with c1:
+                if st.button("Yes, delete"):
+                    delete_item(item_id)
+                    forget("item", item_id)
+                    go_to_list()
+                    st.rerun()
+            with c2:
+                st.button("Cancel", on_click=_set_state, args=(confirm_key, False))
+
+
 # ---- Sidebar ----
 st.sidebar.title("\U0001F4DA Learning Tracker")
 
@@ -103,50 +470,14 @@ for t in ITEM_TYPES:
 
 st.sidebar.divider()
 
-# Export
-@st.cache_data(ttl=60)
-def _cached_export():
-    return export_all()
-
-export_data = _cached_export()
-st.sidebar.download_button(
-    "Export Data",
-    data=json.dumps(export_data, indent=2, default=str),
-    file_name=f"learning-tracker-{datetime.now().strftime('%Y-%m-%d')}.json",
-    mime="application/json",
-)
-
-# Import
-uploaded = st.sidebar.file_uploader("Import Data", type=["json"], key="import_file")
-if uploaded is not None:
-    try:
-        data = json.loads(uploaded.read())
-        import_all(data)
-        st.sidebar.success("Data imported!")
-        st.rerun()
-    except Exception as e:
-        st.sidebar.error(f"Import failed: {e}")
-
-
-# ---- View routing ----
-if "view" not in st.session_state:
-    st.session_state["view"] = "list"
-if "detail_item_id" not in st.session_state:
-    st.session_state["detail_item_id"] = None
-
-
-def go_to_detail(item_id: str):
-    st.session_state["view"] = "detail"
-    st.session_state["detail_item_id"] = item_id
-
-
-def go_to_list():
-    st.session_state["view"] = "list"
-    st.session_state["detail_item_id"] = None
+with st.sidebar:
+    _sidebar_data()
 
 
 # ---- LIST VIEW ----
-if st.session_state["view"] == "list":
+@st.fragment
+def _item_list(status_filter: str, type_filters: list[str]):
+    """Add-item form and the grid; loads its own rows."""
     # Add item form
     with st.expander("Add New Item", expanded=False):
         with st.form("add_item_form", clear_on_submit=True):
@@ -195,130 +526,53 @@ if st.session_state["view"] == "list":
                     add_checkpoint(item["id"], 0.0, timestamp=created)
 
                     st.success(f"Added: {new_name.strip()}")
-                    st.rerun()
-
-    # Fetch and filter items
-    items = get_items(status=status_filter)
-    if type_filters:
-        items = [i for i in items if i["item_type"] in type_filters]
-    else:
-        items = []
+                    _rerun_fragment()
+
+    # Fetch filtered items with their estimations in one round trip
+    rows = get_item_estimations(status_filter, type_filters) if type_filters else []
+    if rows is None:
+        # item_estimations() not installed: fetch and compute locally
+        items = [i for i in get_items(status=status_filter) if i["item_type"] in type_filters]
+        all_item_cps = get_all_checkpoints_for_items(
+            [i["id"] for i in items], columns=ESTIMATION_COLUMNS
+        )
+        rows = [estimation_row(item, all_item_cps[item["id"]]) for item in items]
 
-    if not items:
+    if not rows:
         st.info("No items found. Add one above or adjust your filters.")
     else:
-        # Display as grid (3 columns)
-        all_item_cps = get_all_checkpoints_for_items([i["id"] for i in items])
-        cols = st.columns(3)
-        for idx, item in enumerate(items):
-            cps = all_item_cps[item["id"]]
-            est = compute_estimation(item, cps)
-            with cols[idx % 3]:
-                with st.container(border=True):
-                    st.markdown(f"**{item['name']}**")
-                    st.caption(_type_badge(item["item_type"]))
-                    progress_val = est["percent"] / 100
-                    st.progress(min(progress_val, 1.0))
-                    unit = item["unit_type"]
-                    st.caption(
-                        f"{format_unit_value(est['current'], unit)} / "
-                        f"{format_unit_value(item['total_units'], unit)} {unit} "
-                        f"({est['percent']:.0f}%)"
-                    )
-                    if est["eta"]:
-                        st.caption(f"ETA: {format_eta(est['eta'])}")
-                    else:
-                        st.caption("ETA: ~100 years")
-                    st.button(
-                        "View Details",
-                        key=f"detail_{item['id']}",
-                        on_click=go_to_detail,
-                        args=(item["id"],),
-                    )
+        _item_grid(rows)
 
-# ---- DETAIL VIEW ----
-elif st.session_state["view"] == "detail":
-    item_id = st.session_state["detail_item_id"]
-    item = get_item(item_id) if item_id else None
 
+# ---- DETAIL VIEW ----
+@st.fragment
+def _item_detail(item_id: str):
+    """Everything below the back button; loads its own item, checkpoints and estimation."""
+    item = get_item(item_id)
     if not item:
         st.error("Item not found.")
-        st.button("Back to List", on_click=go_to_list)
-        st.stop()
-
-    components.html(
-        """<script>
-        setTimeout(() => {
-            const main = window.parent.document.querySelector('[data-testid="stMain"]');
-            if (main) main.scrollTop = 0;
-            window.parent.scrollTo(0, 0);
-        }, 100);
-        </script>""",
-        height=0,
-    )
-    st.button("\u2190 Back to List", on_click=go_to_list)
-
-    # Header
-    col_h1, col_h2 = st.columns([3, 1])
-    with col_h1:
-        st.title(item["name"])
-    with col_h2:
-        st.markdown(f":{TYPE_COLORS[item['item_type']]}[{_type_badge(item['item_type'])}]")
-        st.markdown(f"**Status:** {STATUS_LABELS[item['status']]}")
+        return
 
-    all_cps = get_checkpoints(item_id)
+    all_cps = get_checkpoints(item_id, columns=CHART_COLUMNS)
     completed_cps = [cp for cp in all_cps if cp.get("status", "completed") == "completed"]
-    est = compute_estimation(item, all_cps)
+    # Results from worker.py when current, else computed here
+    precomputed = get_precomputed(item_id)
+    if precomputed:
+        est = decode_estimation(precomputed["estimation"])
+        eta_quantiles = decode_estimation(precomputed["eta_quantiles"])
+    else:
+        est = compute_estimation(item, all_cps)
+        eta_quantiles = compute_eta_quantiles(item, all_cps)
     unit = item["unit_type"]
 
-    # Progress bar
-    progress_val = est["percent"] / 100
-    st.progress(min(progress_val, 1.0))
+    # Notes are loaded only for the rows shown in the checkpoint table
+    shown = st.session_state.get(ui_key("item", item_id, "cp_rows"), CHECKPOINT_PAGE_SIZE)
+    notes = get_checkpoint_notes(item_id, [cp["id"] for cp in completed_cps[-shown:]])
+    completed_cps = [
+        {**cp, "notes": notes[cp["id"]]} if cp["id"] in notes else cp for cp in completed_cps
+    ]
 
-    # Editable total units
-    edit_total_key = f"editing_total_{item_id}"
-    if edit_total_key not in st.session_state:
-        st.session_state[edit_total_key] = False
-
-    if st.session_state[edit_total_key]:
-        et_cols = st.columns([2, 1, 1])
-        with et_cols[0]:
-            new_total = st.number_input(
-                f"Total {unit}",
-                min_value=0.1,
-                step=1.0,
-                value=float(item["total_units"]),
-                key=f"new_total_{item_id}",
-            )
-        with et_cols[1]:
-            if st.button("Save", key=f"save_total_{item_id}"):
-                update_item_total(item_id, new_total)
-                st.session_state[edit_total_key] = False
-                st.rerun()
-        with et_cols[2]:
-            if st.button("Cancel", key=f"cancel_total_{item_id}"):
-                st.session_state[edit_total_key] = False
-                st.rerun()
-    else:
-        prog_cols = st.columns([5, 1])
-        with prog_cols[0]:
-            st.caption(
-                f"{format_unit_value(est['current'], unit)} / "
-                f"{format_unit_value(item['total_units'], unit)} {unit} ({est['percent']:.0f}%)"
-            )
-        with prog_cols[1]:
-            if st.button("Edit", key=f"edit_total_{item_id}"):
-                st.session_state[edit_total_key] = True
-                st.rerun()
-
-    # Stats
-    stat_cols = st.columns(3)
-    with stat_cols[0]:
-        st.metric("Speed", format_speed(est["speed"], unit))
-    with stat_cols[1]:
-        st.metric("Time Remaining", format_duration(est["hours_remaining"]))
-    with stat_cols[2]:
-        st.metric("Estimated Completion", format_eta(est["eta"]))
+    _detail_header(item, est, eta_quantiles)
 
     # Add checkpoint form
     st.subheader("Add Checkpoint")
@@ -359,132 +613,40 @@ elif st.session_state["view"] == "detail":
                 ts = datetime.now(timezone.utc).isoformat()
             add_checkpoint(item_id, final_units, timestamp=ts, notes=cp_notes or None)
             st.success("Checkpoint added!")
-            st.rerun()
-
-    # Chart
-    st.subheader("Progress Chart")
-    fig = build_progress_chart(item, completed_cps, est)
-    st.plotly_chart(fig, use_container_width=True)
+            _rerun_fragment()
 
-    # Checkpoints table (completed only)
-    st.subheader("Checkpoints")
-    if completed_cps:
-        for cp in completed_cps:
-            edit_cp_key = f"editing_cp_{cp['id']}"
-            if edit_cp_key not in st.session_state:
-                st.session_state[edit_cp_key] = False
-
-            if st.session_state[edit_cp_key]:
-                # Edit mode
-                local_dt = _utc_to_local(cp["timestamp"])
-                ec_cols = st.columns([2, 2, 2, 3, 1, 1])
-                with ec_cols[0]:
-                    edit_units = st.number_input(
-                        "Units",
-                        min_value=0.0,
-                        step=1.0,
-                        value=float(cp["units_completed"]),
-                        key=f"edit_units_{cp['id']}",
-                        label_visibility="collapsed",
-                    )
-                with ec_cols[1]:
-                    edit_date = st.date_input(
-                        "Date",
-                        value=local_dt.date(),
-                        key=f"edit_date_{cp['id']}",
-                        label_visibility="collapsed",
-                    )
-                with ec_cols[2]:
-                    edit_time = st.time_input(
-                        "Time",
-                        value=local_dt.time(),
-                        key=f"edit_time_{cp['id']}",
-                        label_visibility="collapsed",
-                    )
-                with ec_cols[3]:
-                    edit_notes = st.text_input(
-                        "Notes",
-                        value=cp.get("notes") or "",
-                        key=f"edit_notes_{cp['id']}",
-                        label_visibility="collapsed",
-                    )
-                with ec_cols[4]:
-                    if st.button("Save", key=f"save_cp_{cp['id']}"):
-                        new_local = datetime.combine(
-                            edit_date, edit_time, tzinfo=_local_tz()
-                        )
-                        new_ts = _local_to_utc(new_local)
-                        update_checkpoint(
-                            cp["id"],
-                            edit_units,
-                            new_ts,
-                            edit_notes or None,
-                        )
-                        st.session_state[edit_cp_key] = False
-                        st.rerun()
-                with ec_cols[5]:
-                    if st.button("Cancel", key=f"cancel_cp_{cp['id']}"):
-                        st.session_state[edit_cp_key] = False
-                        st.rerun()
-            else:
-                # Display mode
-                cp_cols = st.columns([2, 3, 3, 1, 1, 1])
-                with cp_cols[0]:
-                    st.write(f"{format_unit_value(cp['units_completed'], unit)} {unit}")
-                with cp_cols[1]:
-                    st.write(_format_local_ts(cp["timestamp"]))
-                with cp_cols[2]:
-                    st.write(cp.get("notes") or "")
-                with cp_cols[3]:
-                    if st.button("\U0001F504", key=f"refresh_ts_{cp['id']}", help="Set to now"):
-                        update_checkpoint_timestamp(cp["id"])
-                        st.rerun()
-                with cp_cols[4]:
-                    if st.button("Edit", key=f"edit_cp_{cp['id']}"):
-                        st.session_state[edit_cp_key] = True
-                        st.rerun()
-                with cp_cols[5]:
-                    st.button(
-                        "\U0001F5D1",
-                        key=f"del_cp_{cp['id']}",
-                        on_click=lambda cid=cp["id"]: (delete_checkpoint(cid),),
-                        help="Delete checkpoint",
-                    )
-    else:
-        st.info("No checkpoints yet.")
+    # The worker labels the chart with the default page of notes
+    chart = precomputed["chart"] if precomputed and shown == CHECKPOINT_PAGE_SIZE else None
+    _detail_chart(item, completed_cps, est, eta_quantiles, chart)
+    _checkpoint_table(item, completed_cps, shown)
 
     # Status change & delete
     st.divider()
-    action_cols = st.columns([2, 1])
-    with action_cols[0]:
-        current_idx = list(STATUSES).index(item["status"])
-        new_status = st.selectbox(
-            "Change Status",
-            options=list(STATUSES),
-            index=current_idx,
-            format_func=lambda s: STATUS_LABELS[s],
-            key="status_change",
-        )
-        if new_status != item["status"]:
-            if st.button("Update Status"):
-                update_item_status(item_id, new_status)
-                st.success(f"Status changed to {STATUS_LABELS[new_status]}")
-                st.rerun()
-    with action_cols[1]:
-        st.markdown("&nbsp;", unsafe_allow_html=True)
-        if st.button("Delete Item", type="primary"):
-            st.session_state["confirm_delete"] = True
+    _item_actions(item)
 
-        if st.session_state.get("confirm_delete"):
-            st.warning("Are you sure? This cannot be undone.")
-            c1, c2 = st.columns(2)
-            with c1:
-                if st.button("Yes, delete"):
-                    delete_item(item_id)
-                    st.session_state["confirm_delete"] = False
-                    go_to_list()
-                    st.rerun()
-            with c2:
-                if st.button("Cancel"):
-                    st.session_state["confirm_delete"] = False
-                    st.rerun()
+
+# ---- Views ----
+if st.session_state["view"] == "list":
+    _item_list(status_filter, type_filters)
+elif st.session_state["view"] == "detail":
+    components.html(
+        """<script>
+        setTimeout(() => {
+            const main = window.parent.document.querySelector('[data-testid="stMain"]');
+            if (main) main.scrollTop = 0;
+            window.parent.scrollTo(0, 0);
+        }, 100);
+        </script>""",
+        height=0,
+    )
+    st.button("\u2190 Back to List", on_click=go_to_list)
+    if st.session_state["detail_item_id"]:
+        _item_detail(st.session_state["detail_item_id"])
+    else:
+        st.error("Item not found.")
+
+# ---- Payload report ----
+st.sidebar.caption(f"Data fetched this run: {reset_payload_bytes() / 1024:.1f} KB")
+
+# ---- Session state GC ----
+collect_ui_state()
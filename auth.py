@@ -2,12 +2,15 @@ import hashlib
 import hmac
 import os
 import time
+from functools import lru_cache
 
 import streamlit as st
-from streamlit_cookies_controller import CookieController
 
 _COOKIE_NAME = "tracker_auth"
 _COOKIE_MAX_AGE = 30 * 24 * 60 * 60  # 30 days
+# Tokens issued before expiry was added (a bare HMAC of the password) are
+# accepted until then and replaced with a new token when seen
+_LEGACY_TOKEN_CUTOFF = 1794960000  # 2026-11-18 00:00 UTC
 
 
 def _get_password() -> str | None:
@@ -26,25 +29,72 @@ def _get_cookie_secret() -> str | None:
         return os.environ.get("COOKIE_SECRET")
 
 
-def _make_auth_token(password: str) -> str:
-    """Create HMAC-SHA256 token from the password and cookie secret."""
+@lru_cache(maxsize=4)
+def _derive_key(secret: str, password: str) -> bytes:
+    """
+    Signing key bound to the cookie secret and password (changing either
+    revokes tokens). Domain-separated, so it never equals a legacy token.
+    """
+    return hmac.new(secret.encode(), b"auth-v2:" + password.encode(), hashlib.sha256).digest()
+
+
+def _is_legacy_token(token: str) -> bool:
+    """Token in the format from before expiry was added (no "<expiry>." prefix)."""
+    return bool(token) and not token.partition(".")[0].isdigit()
+
+
+def _make_auth_token(password: str, expires: int | None = None) -> str:
+    """Create a signed "<expiry>.<hmac>" token. Empty if no cookie secret is set."""
     secret = _get_cookie_secret()
     if not secret:
         return ""
-    return hmac.new(
-        secret.encode(), password.encode(), hashlib.sha256
-    ).hexdigest()
+    expires = expires or int(time.time()) + _COOKIE_MAX_AGE
+    sig = hmac.new(_derive_key(secret, password), str(expires).encode(), hashlib.sha256)
+    return f"{expires}.{sig.hexdigest()}"
 
 
 def _verify_auth_token(token: str) -> bool:
-    """Timing-safe comparison of the token against the expected value."""
+    """Check signature and expiry locally with a timing-safe comparison."""
     password = _get_password()
-    if not password:
+    secret = _get_cookie_secret()
+    if not password or not secret or not token:
         return False
-    expected = _make_auth_token(password)
-    if not expected:
+    if _is_legacy_token(token):
+        if time.time() >= _LEGACY_TOKEN_CUTOFF:
+            return False
+        legacy = hmac.new(secret.encode(), password.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(token, legacy)
+    expires, _, _ = token.partition(".")
+    if int(expires) < time.time():
         return False
-    return hmac.compare_digest(token, expected)
+    return hmac.compare_digest(token, _make_auth_token(password, int(expires)))
+
+
+def _read_cookie() -> str | None:
+    """Auth cookie from the request headers, without a component round trip."""
+    try:
+        return st.context.cookies.get(_COOKIE_NAME)
+    except AttributeError:
+        return None
+
+
+def _set_cookie(token: str):
+    """Persist the token in the browser via the cookie component."""
+    from streamlit_cookies_controller import CookieController
+
+    # Hide the invisible iframe rendered by CookieController
+    st.markdown(
+        "<style>iframe[title='streamlit_cookies_controller.cookie_controller']"
+        "{display:none}</style>",
+        unsafe_allow_html=True,
+    )
+    CookieController().set(
+        _COOKIE_NAME,
+        token,
+        path="/",
+        same_site="lax",
+        max_age=_COOKIE_MAX_AGE,
+    )
 
 
 def check_auth() -> bool:
@@ -57,38 +107,31 @@ def check_auth() -> bool:
     if st.session_state.get("authenticated"):
         return True
 
-    # Hide the invisible iframe rendered by CookieController
-    st.markdown(
-        "<style>iframe[title='streamlit_cookies_controller.cookie_controller']"
-        "{display:none}</style>",
-        unsafe_allow_html=True,
-    )
-    controller = CookieController()
-
-    # Check cookie for persistent auth
-    token = controller.get(_COOKIE_NAME)
-    if token and _verify_auth_token(token):
+    # Persistent auth: the cookie arrives with the page request, verified locally
+    cookie = _read_cookie() or ""
+    if _verify_auth_token(cookie):
         st.session_state["authenticated"] = True
+        if _is_legacy_token(cookie):
+            _set_cookie(_make_auth_token(password))
         return True
 
-    # Show login form
-    st.title("Learning Tracker")
-    entered = st.text_input("Password", type="password", key="auth_password_input")
-    if st.button("Login", key="auth_login_btn"):
-        if hmac.compare_digest(entered, password):
-            st.session_state["authenticated"] = True
-            # Persist auth via cookie
-            cookie_secret = _get_cookie_secret()
-            if cookie_secret:
-                controller.set(
-                    _COOKIE_NAME,
-                    _make_auth_token(password),
-                    path="/",
-                    same_site="lax",
-                    max_age=_COOKIE_MAX_AGE,
-                )
-                time.sleep(0.5)
-            st.rerun()
-        else:
+    # Show login form in a placeholder so a successful login can clear it and
+    # render the app in the same run
+    gate = st.empty()
+    with gate.container():
+        st.title("Learning Tracker")
+        entered = st.text_input("Password", type="password", key="auth_password_input")
+        if not st.button("Login", key="auth_login_btn"):
+            return False
+        if not hmac.compare_digest(entered, password):
             st.error("Incorrect password.")
-    return False
+            return False
+
+    gate.empty()
+    st.session_state["authenticated"] = True
+    token = _make_auth_token(password)
+    if token:
+        # The run continues, so the component stays mounted long enough to
+        # write the cookie (no sleep + rerun needed)
+        _set_cookie(token)
+    return True
@@ -1,11 +1,20 @@
+import json
+
 import plotly.graph_objects as go
 from dateutil.parser import parse as parse_dt
 from datetime import datetime, timezone, timedelta
 
 def build_progress_chart(
-    item: dict, completed_cps: list[dict], estimation: dict
+    item: dict,
+    completed_cps: list[dict],
+    estimation: dict,
+    eta_quantiles: dict | None = None,
 ) -> go.Figure:
-    """Build a Plotly scatter chart with actual progress + projection line."""
+    """Build a Plotly scatter chart with actual progress + projection line.
+
+    When eta_quantiles (from compute_eta_quantiles) is given, a P10–P90 fan
+    and the P50 path are drawn from the last checkpoint to the total.
+    """
     total = item["total_units"]
     unit = item["unit_type"]
 
@@ -56,6 +65,32 @@ def build_progress_chart(
             )
         )
 
+    # ETA fan (P10–P90) and median path
+    if eta_quantiles:
+        t_last = eta_quantiles["t_last"]
+        current = values[-1]
+        fig.add_trace(
+            go.Scatter(
+                x=[t_last, eta_quantiles["p10"], eta_quantiles["p90"], t_last],
+                y=[current, total, total, current],
+                mode="lines",
+                fill="toself",
+                name="ETA P10\u2013P90",
+                line=dict(color="rgba(39, 174, 96, 0.4)", width=1),
+                fillcolor="rgba(39, 174, 96, 0.15)",
+                hoverinfo="skip",
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=[t_last, eta_quantiles["p50"]],
+                y=[current, total],
+                mode="lines",
+                name="ETA P50",
+                line=dict(color="#27ae60", width=2, dash="dot"),
+            )
+        )
+
     fig.update_layout(
         xaxis_title="Time",
         yaxis_title=unit.capitalize(),
@@ -67,3 +102,15 @@ def build_progress_chart(
     )
 
     return fig
+
+
+def chart_to_json(fig: go.Figure) -> dict:
+    """Plotly JSON for storage. The default template is dropped (restored on load)."""
+    data = json.loads(fig.to_json())
+    data.get("layout", {}).pop("template", None)
+    return data
+
+
+def chart_from_json(data: dict) -> go.Figure:
+    """Rebuild a figure stored with chart_to_json()."""
+    return go.Figure(data)
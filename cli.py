@@ -0,0 +1,497 @@
+"""
+Headless command-line entry point for bulk operations.
+
+Runs db.py operations without the Streamlit runtime. Supabase credentials
+come from SUPABASE_URL / SUPABASE_KEY in the environment, or from a TOML
+file given with --config (e.g. .streamlit/secrets.toml). Input is streamed
+from files or stdin ("-"), written in batches of --batch-size rows with up to
+--concurrency requests in flight, and throughput stats go to stderr.
+
+Examples:
+    python cli.py export --format snapshot -o backup.ltsnap
+    python cli.py import backup.ltsnap --batch-size 5000
+    python cli.py set-status waitlist < item_ids.txt
+    python cli.py backfill checkpoints.jsonl --concurrency 8
+    python cli.py convert-legacy old.json -o new.json
+    python cli.py compact --dry-run
+    python cli.py backup backups/ --prune
+    python cli.py restore backups/ --at 2025-03-01T12:00:00Z -o restored.json
+    python cli.py check-estimations --live
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tomllib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+PROGRESS_SECONDS = 5.0
+JSON_CHUNK_CHARS = 1 << 16
+
+_JSON = json.JSONDecoder()
+_JSON_WS = " \t\r\n"
+_JSON_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class Throughput:
+    """Row counter that reports rows/s to stderr periodically and at the end."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.requests = 0
+        self._start = time.monotonic()
+        self._last_report = self._start
+        self._lock = threading.Lock()
+
+    def add(self, rows: int):
+        with self._lock:
+            self.rows += rows
+            self.requests += 1
+            now = time.monotonic()
+            if now - self._last_report >= PROGRESS_SECONDS:
+                self._last_report = now
+                self._report("progress")
+
+    def _report(self, prefix: str):
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        print(
+            f"{prefix}: {self.label} rows={self.rows} requests={self.requests} "
+            f"seconds={elapsed:.1f} rows/s={self.rows / elapsed:.0f}",
+            file=sys.stderr,
+        )
+
+    def done(self):
+        self._report("done")
+
+
+def load_config(path: str | None):
+    """Copy top-level string settings from a TOML file into the environment."""
+    if not path:
+        return
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    for key, value in config.items():
+        if isinstance(value, (str, int, float)):
+            os.environ.setdefault(key, str(value))
+
+
+def _open_text(path: str):
+    return sys.stdin if path == "-" else open(path, encoding="utf-8")
+
+
+def _batched(rows: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batches(batches: Iterable[list], fn, concurrency: int, stats: Throughput):
+    """Apply fn to each batch with at most `concurrency` batches in flight."""
+    def work(batch):
+        fn(batch)
+        stats.add(len(batch))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        for batch in batches:
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    fut.result()
+            pending.add(pool.submit(work, batch))
+        for fut in pending:
+            fut.result()
+
+
+def _iter_json_object(f, chunk_chars: int = JSON_CHUNK_CHARS) -> Iterator[tuple[str, object]]:
+    """
+    Parse a top-level JSON object from f a chunk at a time. Yields (key,
+    element) for every element of an array value and (key, value) for any
+    other value, so memory is bounded by the largest element, not the file.
+    """
+    buf, pos, eof = "", 0, False
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        data = "" if eof else f.read(chunk_chars)
+        if not data:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + data, 0
+        return True
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _JSON_WS:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                raise ValueError("Unexpected end of JSON input")
+
+    def take(allowed: str) -> str:
+        nonlocal pos
+        char = peek()
+        if char not in allowed:
+            raise ValueError(f"Expected one of {allowed!r} in JSON input, got {char!r}")
+        pos += 1
+        return char
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = _JSON.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if more():
+                    continue
+                raise
+            # A number cut off by the end of the buffer (e.g. "12" of "12.5")
+            # continues in the next chunk
+            cut = end == len(buf) or (
+                isinstance(obj, (int, float)) and buf[end] in _JSON_NUMBER_CHARS
+            )
+            if not cut or not more():
+                pos = end
+                return obj
+
+    take("{")
+    if peek() == "}":
+        return
+    while True:
+        key = value()
+        if not isinstance(key, str):
+            raise ValueError("Expected a string key in JSON input")
+        take(":")
+        if peek() == "[":
+            take("[")
+            if peek() == "]":
+                take("]")
+            else:
+                while True:
+                    yield key, value()
+                    if take(",]") == "]":
+                        break
+        else:
+            yield key, value()
+        if take(",}") == "}":
+            return
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+# ---- Commands ----
+
+
+def _write_json_pages(out, tables: dict[str, Iterable[list[dict]]]):
+    """json.dumps(tables, indent=2) for tables given as pages of rows, written row by row."""
+    out.write(b"{")
+    for t, (name, pages) in enumerate(tables.items()):
+        out.write(f'{"," if t else ""}\n  {json.dumps(name)}: ['.encode())
+        first = True
+        for page in pages:
+            for row in page:
+                text = json.dumps(row, indent=2, default=str).replace("\n", "\n    ")
+                out.write(f'{"" if first else ","}\n    {text}'.encode())
+                first = False
+        out.write(b"]" if first else b"\n  ]")
+    out.write(b"\n}")
+
+
+def _counted(pages: Iterable[list[dict]], stats: Throughput) -> Iterator[list[dict]]:
+    for page in pages:
+        stats.add(len(page))
+        yield page
+
+
+def cmd_export(args):
+    from db import iter_export
+    from snapshot import write_snapshot_pages
+
+    stats = Throughput("export")
+    items, checkpoints = (_counted(pages, stats) for pages in iter_export())
+
+    def write(out):
+        if args.format == "snapshot":
+            write_snapshot_pages(out, items, checkpoints)
+        else:
+            _write_json_pages(out, {"items": items, "checkpoints": checkpoints})
+
+    if args.output == "-":
+        write(sys.stdout.buffer)
+    else:
+        # Rows are streamed as they are read, so a failed export must not
+        # leave a truncated file in place of the previous one
+        tmp = args.output + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, args.output)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    stats.done()
+
+
+def _json_rows(path: str, table: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for key, value in _iter_json_object(f):
+            if key == table:
+                yield value
+
+
+def _import_file(path: str, args):
+    import db
+    from snapshot import MAGIC, is_snapshot, iter_rows, open_snapshot
+
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+
+    if is_snapshot(head):
+        # Stream record batches from the memory-mapped snapshot
+        snap = open_snapshot(path)
+        sources = {
+            table: (row for batch in iter_rows(reader, table) for row in batch)
+            for table, reader in (("items", snap.items), ("checkpoints", snap.checkpoints))
+        }
+    else:
+        # Parse the whole file once before clearing anything, so a malformed
+        # file fails the import up front; then stream each table in its own pass
+        with open(path, encoding="utf-8") as f:
+            keys = {key for key, _ in _iter_json_object(f)}
+        if "books" in keys:
+            # Legacy files are small, and converting assigns the item ids
+            from migration import convert_legacy
+            with open(path, encoding="utf-8") as f:
+                data = convert_legacy(json.load(f))
+            sources = {table: iter(data[table]) for table in ("items", "checkpoints")}
+        else:
+            sources = {table: _json_rows(path, table) for table in ("items", "checkpoints")}
+
+    stats = Throughput("import")
+    db.clear_all()
+    # All items are in before the first checkpoint (foreign key)
+    for table, insert in (("items", db.insert_items), ("checkpoints", db.insert_checkpoints)):
+        run_batches(_batched(sources[table], args.batch_size), insert, args.concurrency, stats)
+    stats.done()
+
+
+def cmd_import(args):
+    if args.input != "-":
+        _import_file(args.input, args)
+        return
+    # Spooled to disk: snapshots are memory-mapped and JSON is read in passes
+    with tempfile.NamedTemporaryFile(suffix=".import") as spool:
+        shutil.copyfileobj(sys.stdin.buffer, spool)
+        spool.flush()
+        _import_file(spool.name, args)
+
+
+def cmd_set_status(args):
+    from db import update_items_status
+
+    ids = args.item_ids or _read_lines("-")
+    stats = Throughput(f"set-status {args.status}")
+    run_batches(
+        _batched(ids, args.batch_size),
+        lambda batch: update_items_status(batch, args.status),
+        args.concurrency,
+        stats,
+    )
+    stats.done()
+
+
+def cmd_backfill(args):
+    from db import insert_checkpoints
+
+    rows = (json.loads(line) for line in _read_lines(args.input))
+    stats = Throughput("backfill")
+    run_batches(_batched(rows, args.batch_size), insert_checkpoints, args.concurrency, stats)
+    stats.done()
+
+
+def cmd_convert_legacy(args):
+    from migration import convert_legacy
+
+    with _open_text(args.input) as f:
+        data = convert_legacy(json.load(f))
+    text = json.dumps(data, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(
+        f"done: converted items={len(data['items'])} checkpoints={len(data['checkpoints'])}",
+        file=sys.stderr,
+    )
+
+
+def cmd_compact(args):
+    from compaction import compact_all
+
+    stats = Throughput("compact")
+    totals = compact_all(dry_run=args.dry_run)
+    stats.add(totals["archived"])
+    print(", ".join(f"{k}={v}" for k, v in totals.items()))
+    stats.done()
+
+
+def cmd_backup(args):
+    from journal import incremental_backup
+
+    stats = Throughput("backup")
+    result = incremental_backup(args.backup_dir, prune=args.prune)
+    stats.add(result["entries"])
+    print(", ".join(f"{k}={v}" for k, v in result.items()))
+    stats.done()
+
+
+def cmd_restore(args):
+    from dateutil.parser import parse as parse_dt
+
+    import db
+    from journal import restore
+
+    at = None
+    if args.at:
+        at = parse_dt(args.at)
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+    stats = Throughput("restore")
+    data = restore(args.backup_dir, at)
+    stats.add(len(data["items"]) + len(data["checkpoints"]))
+    if args.apply:
+        db.import_all(data, batch_size=args.batch_size)
+    else:
+        text = json.dumps(data, indent=2, default=str)
+        if args.output == "-":
+            print(text)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+    stats.done()
+
+
+def cmd_check_estimations(args):
+    from estimation_sql import check_parity, parity_dataset
+
+    now = datetime.now(timezone.utc)
+    if args.input:
+        with _open_text(args.input) as f:
+            data = json.load(f)
+    else:
+        data = parity_dataset(args.items, args.seed, now)
+    problems = check_parity(data, now, live=args.live)
+    for problem in problems[:args.max_report]:
+        print(problem)
+    print(
+        f"done: items={len(data['items'])} checkpoints={len(data['checkpoints'])} "
+        f"mismatches={len(problems)}",
+        file=sys.stderr,
+    )
+    if problems:
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="TOML file with SUPABASE_URL / SUPABASE_KEY")
+    common.add_argument("--batch-size", type=int, default=1000, help="Rows per request")
+    common.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+
+    parser = argparse.ArgumentParser(
+        description="Learning Tracker bulk operations (no Streamlit runtime needed)."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", parents=[common], help="Dump all items and checkpoints")
+    p.add_argument("--format", choices=("json", "snapshot"), default="json")
+    p.add_argument("-o", "--output", default="-")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser(
+        "import", parents=[common], help="Replace all data from a JSON or snapshot file"
+    )
+    p.add_argument("input", help="File path or - for stdin")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser(
+        "set-status", parents=[common], help="Change the status of items (IDs as args or stdin)"
+    )
+    p.add_argument("status")
+    p.add_argument("item_ids", nargs="*")
+    p.set_defaults(func=cmd_set_status)
+
+    p = sub.add_parser("backfill", parents=[common], help="Insert checkpoints from JSON lines")
+    p.add_argument("input", nargs="?", default="-", help="JSONL file or - for stdin")
+    p.set_defaults(func=cmd_backfill)
+
+    p = sub.add_parser(
+        "convert-legacy", parents=[common], help="Convert a legacy books export (no DB access)"
+    )
+    p.add_argument("input", nargs="?", default="-")
+    p.add_argument("-o", "--output", default="-")
+    p.set_defaults(func=cmd_convert_legacy)
+
+    p = sub.add_parser("compact", parents=[common], help="Run checkpoint compaction")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("backup", parents=[common], help="Incremental backup from the journal")
+    p.add_argument("backup_dir")
+    p.add_argument("--prune", action="store_true", help="Delete backed-up journal entries")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser(
+        "restore", parents=[common], help="Rebuild data as of a point in time from a backup"
+    )
+    p.add_argument("backup_dir")
+    p.add_argument("--at", help="ISO timestamp (UTC if no offset); default: latest")
+    target = p.add_mutually_exclusive_group()
+    target.add_argument("-o", "--output", default="-", help="Write JSON export here")
+    target.add_argument("--apply", action="store_true", help="Replace all data in the DB")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser(
+        "check-estimations",
+        parents=[common],
+        help="Check item_estimations() SQL against the Python estimator",
+    )
+    p.add_argument("--input", help="JSON export to check on (default: synthetic data)")
+    p.add_argument("--items", type=int, default=200, help="Synthetic items")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--live", action="store_true", help="Also check the Supabase function")
+    p.add_argument("--max-report", type=int, default=20, help="Mismatches to print")
+    p.set_defaults(func=cmd_check_estimations)
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    load_config(args.config)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
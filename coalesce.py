@@ -0,0 +1,196 @@
+"""
+Read middleware for the data layer.
+
+Identical reads that are in flight at the same time (e.g. several sessions
+rerunning together) are merged into one backend request (singleflight).
+Each call gets a deadline, transient failures are retried with jittered
+backoff, and a duplicate "hedged" request is sent when the first one is
+slower than the observed latency percentile for that kind of read.
+
+An attempt that outlives its deadline keeps its pool thread until the backend
+call returns, so each read key may have at most MAX_ATTEMPTS_PER_KEY attempts
+running. Past that, no hedge is sent and a new attempt fails as a transient
+timeout (retried with backoff), instead of piling more threads onto a hung read.
+"""
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+try:
+    import httpx
+    TRANSIENT_ERRORS: tuple = (ConnectionError, TimeoutError, httpx.TransportError)
+except ImportError:  # pragma: no cover - httpx ships with supabase
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+DEADLINE_SECONDS = 10.0
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 2.0
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+MAX_ATTEMPTS_PER_KEY = 2
+
+METRICS = {
+    "calls": 0,
+    "backend_requests": 0,
+    "coalesced": 0,
+    "hedged": 0,
+    "retried": 0,
+    "timeouts": 0,
+    "capped": 0,
+}
+
+_lock = threading.RLock()
+_inflight: dict[tuple, Future] = {}
+_latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_outstanding: dict[tuple, int] = defaultdict(int)
+_generation = 0
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="db-read")
+
+
+def _count(name: str, n: int = 1):
+    with _lock:
+        METRICS[name] += n
+
+
+def get_metrics() -> dict:
+    """Snapshot of the middleware counters."""
+    with _lock:
+        return dict(METRICS)
+
+
+def invalidate():
+    """
+    Start a new read generation. Called after every write so that reads
+    issued afterwards never join a request that started before the write.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def _hedge_after(op: str) -> float | None:
+    """Latency (seconds) after which a duplicate request is sent, if known."""
+    with _lock:
+        samples = sorted(_latencies[op])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)]
+
+
+def _timed(op: str, fn):
+    start = time.monotonic()
+    result = fn()
+    with _lock:
+        _latencies[op].append(time.monotonic() - start)
+    return result
+
+
+def _release(key: tuple):
+    with _lock:
+        _outstanding[key] -= 1
+        if not _outstanding[key]:
+            del _outstanding[key]
+
+
+def _submit(key: tuple, fn) -> Future | None:
+    """Start an attempt, or return None if key has MAX_ATTEMPTS_PER_KEY running."""
+    with _lock:
+        if _outstanding[key] >= MAX_ATTEMPTS_PER_KEY:
+            METRICS["capped"] += 1
+            return None
+        _outstanding[key] += 1
+        METRICS["backend_requests"] += 1
+    fut = _pool.submit(_timed, key[0], fn)
+    fut.add_done_callback(lambda _: _release(key))
+    return fut
+
+
+def _attempt(key: tuple, fn, deadline: float):
+    """One attempt, hedged once if it outlives the latency percentile."""
+    op = key[0]
+    first = _submit(key, fn)
+    if first is None:
+        raise TimeoutError(f"{op} has {MAX_ATTEMPTS_PER_KEY} attempts still running")
+    pending = {first}
+    hedge_after = _hedge_after(op)
+    if hedge_after is not None:
+        done, pending = wait(pending, timeout=min(hedge_after, _remaining(deadline)))
+        if done:
+            return done.pop().result()
+        hedge = _submit(key, fn)
+        if hedge is not None:
+            _count("hedged")
+            pending.add(hedge)
+
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result()
+            error = fut.exception()
+    if error is not None:
+        raise error
+    raise TimeoutError(f"{op} exceeded its deadline")
+
+
+def _remaining(deadline: float) -> float:
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def _run(key: tuple, fn, deadline: float):
+    """Run fn with retries and jittered exponential backoff until the deadline."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return _attempt(key, fn, deadline)
+        except TRANSIENT_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            if delay >= _remaining(deadline):
+                raise
+            _count("retried")
+            time.sleep(delay)
+
+
+def read(key: tuple, fn, deadline: float | None = None):
+    """
+    Return fn() for the read identified by key, sharing the result with any
+    identical read already in flight. key[0] names the kind of read and is
+    used for latency tracking.
+
+    The result object is shared between all coalesced callers and must be
+    treated as read-only.
+    """
+    timeout = DEADLINE_SECONDS if deadline is None else deadline
+    _count("calls")
+    with _lock:
+        flight_key = (_generation, *key)
+        fut = _inflight.get(flight_key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _inflight[flight_key] = fut
+        else:
+            METRICS["coalesced"] += 1
+
+    if leader:
+        try:
+            fut.set_result(_run(key, fn, time.monotonic() + timeout))
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with _lock:
+                _inflight.pop(flight_key, None)
+
+    try:
+        return fut.result(timeout=timeout)
+    except TimeoutError:
+        _count("timeouts")
+        raise
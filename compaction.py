@@ -0,0 +1,136 @@
+"""
+Checkpoint history compaction.
+
+Older completed checkpoints are thinned out according to retention tiers:
+within each time bucket only the latest checkpoint is kept (as a rollup row
+carrying the notes of everything it replaced) and the rest are moved to the
+checkpoints_archive table (migrations/001_checkpoints_archive.sql).
+
+The first and last completed checkpoints of an item are always kept, so
+compute_estimation() returns the same result before and after compaction.
+
+Run as a job:
+    python compaction.py [--dry-run] [--item ITEM_ID]
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse as parse_dt
+
+from db import archive_checkpoints, get_checkpoints, get_items
+
+# (max age, bucket size): checkpoints younger than max age are bucketed at
+# bucket size; a bucket of None keeps every point, a max age of None is the
+# catch-all for anything older.
+RETENTION_TIERS: tuple[tuple[timedelta | None, timedelta | None], ...] = (
+    (timedelta(days=30), None),
+    (timedelta(days=365), timedelta(hours=1)),
+    (None, timedelta(days=1)),
+)
+
+NOTES_SEPARATOR = "; "
+
+
+def _bucket_size(age: timedelta, tiers) -> timedelta | None:
+    for max_age, bucket in tiers:
+        if max_age is None or age < max_age:
+            return bucket
+    return None
+
+
+def plan_compaction(
+    checkpoints: list[dict],
+    now: datetime | None = None,
+    tiers=RETENTION_TIERS,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Work out what to compact for one item's checkpoints.
+    Returns (rollups, archived): rollups are {"id", "notes"} updates for
+    surviving rows whose notes absorbed others; archived are the rows to move,
+    each tagged with rolled_into. Non-completed checkpoints are left alone.
+    """
+    now = now or datetime.now(timezone.utc)
+    completed = [cp for cp in checkpoints if cp.get("status", "completed") == "completed"]
+    completed.sort(key=lambda cp: parse_dt(cp["timestamp"]))
+    if len(completed) < 3:
+        return [], []
+    protected = {completed[0]["id"], completed[-1]["id"]}
+
+    groups: list[list[dict]] = []
+    last_key = None
+    for cp in completed:
+        ts = parse_dt(cp["timestamp"])
+        bucket = _bucket_size(now - ts, tiers)
+        if bucket is None:
+            key = None
+        else:
+            size = bucket.total_seconds()
+            key = (size, int(ts.timestamp() // size))
+        if key is not None and key == last_key:
+            groups[-1].append(cp)
+        else:
+            groups.append([cp])
+        last_key = key
+
+    rollups, archived = [], []
+    for group in groups:
+        if len(group) == 1:
+            continue
+        survivor = group[-1]
+        gone = [cp for cp in group[:-1] if cp["id"] not in protected]
+        if not gone:
+            continue
+        # Skip notes the survivor already carries, so a rerun after an
+        # interrupted archive_checkpoints() doesn't merge them twice
+        sep = NOTES_SEPARATOR
+        carried = f"{sep}{survivor.get('notes') or ''}{sep}"
+        notes = []
+        for cp in gone:
+            note = cp.get("notes")
+            if note and note not in notes and f"{sep}{note}{sep}" not in carried:
+                notes.append(note)
+        if survivor.get("notes"):
+            notes.append(survivor["notes"])
+        merged = NOTES_SEPARATOR.join(notes) or None
+        if merged != survivor.get("notes"):
+            rollups.append({"id": survivor["id"], "notes": merged})
+        archived.extend({**cp, "rolled_into": survivor["id"]} for cp in gone)
+    return rollups, archived
+
+
+def compact_item(item_id: str, now: datetime | None = None, tiers=RETENTION_TIERS,
+                 dry_run: bool = False) -> dict:
+    """Compact one item's checkpoints. Returns counts of archived and rollup rows."""
+    rollups, archived = plan_compaction(get_checkpoints(item_id), now, tiers)
+    if not dry_run and (rollups or archived):
+        archive_checkpoints(archived, rollups)
+    return {"archived": len(archived), "rollups": len(rollups)}
+
+
+def compact_all(now: datetime | None = None, tiers=RETENTION_TIERS,
+                dry_run: bool = False) -> dict:
+    """Compact every item. Returns totals across all items."""
+    totals = {"items": 0, "archived": 0, "rollups": 0}
+    for item in get_items():
+        stats = compact_item(item["id"], now, tiers, dry_run)
+        totals["items"] += 1
+        totals["archived"] += stats["archived"]
+        totals["rollups"] += stats["rollups"]
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact checkpoint history.")
+    parser.add_argument("--item", help="Only compact this item ID")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing")
+    args = parser.parse_args()
+
+    if args.item:
+        stats = compact_item(args.item, dry_run=args.dry_run)
+    else:
+        stats = compact_all(dry_run=args.dry_run)
+    print(", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
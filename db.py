@@ -1,21 +1,234 @@
+import json
+import os
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterator
 
-import streamlit as st
+from dateutil.parser import parse as parse_dt
 from supabase import create_client, Client
 
+import coalesce
+
 ITEM_TYPES = ("book", "audiobook", "youtube_video", "course")
 UNIT_TYPES = ("pages", "hours", "chapters", "videos", "exercises", "questions", "minutes", "files")
 STATUSES = ("active", "waitlist", "abandoned")
 
+# Checkpoint column projections per view
+ESTIMATION_COLUMNS = "item_id,units_completed,timestamp,status"
+CHART_COLUMNS = "id,item_id,units_completed,timestamp,status"
+FULL_COLUMNS = "*"
+
+# Response payload accounting: process-wide totals plus a per-thread counter
+# (one Streamlit script run per thread) for per-rerun reporting.
+PAYLOAD_STATS = {"reads": 0, "bytes": 0}
+_payload_lock = threading.Lock()
+_payload_local = threading.local()
+
+# Change detection (migrations/002_data_revisions.sql). Readers compare the
+# revision of their scope with the one their cached result was fetched at and
+# skip the full read when it hasn't moved.
+#
+# A probe fetches only the scope being read plus 'items' and 'checkpoints'
+# (a few rows, whatever the number of items). A scope with no row is unknown,
+# not revision 0, and is read in full: 007_data_revisions_cleanup.sql gives
+# every live item a row and deletes it with the item.
+#
+# Staleness: each scope is probed at most once per PROBE_TTL_SECONDS per
+# process, so changes made by other processes (other app replicas, cli.py)
+# can be up to PROBE_TTL_SECONDS late. Writes made through this process
+# clear the probed revisions, so its own sessions always read their writes; a
+# probe that was in flight during such a write may have read the old
+# revisions, so its result is dropped (_write_epoch). If the probe fails (e.g.
+# the migration isn't applied) readers fall back to full reads.
+PROBE_TTL_SECONDS = 1.0
+PROBE_RETRY_SECONDS = 60.0
+RESULT_CACHE_SIZE = 256
+PAGE_ROWS = 1000  # Supabase's default PostgREST max-rows
+FETCH_STATS = {"probes": 0, "skipped": 0, "fetched": 0}
+_probe_lock = threading.Lock()
+_revisions: dict[str, tuple[int | None, float]] = {}  # scope -> (revision, probed at)
+_probe_disabled_until = 0.0
+_write_epoch = 0
+_result_cache: OrderedDict[tuple, tuple[int, list[dict]]] = OrderedDict()
+_rpc_disabled_until = 0.0
+
+# Worker results (worker.py, migrations/005_item_precomputed.sql) are used
+# only if computed at the item's current revision and at most this old.
+# Keep in sync with the p_max_age_seconds default of item_estimations().
+PRECOMPUTED_MAX_AGE_SECONDS = 900.0
+# A miss (no current worker row) is remembered this long, so a worker result
+# can reach the app this much later than it is written.
+PRECOMPUTED_MISS_TTL_SECONDS = 30.0
+_precomputed_disabled_until = 0.0
+_precomputed_misses: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
 
 def format_unit_value(value: float, unit_type: str) -> str:
     """Format a unit value for display as a plain integer."""
     return f"{int(value)}"
 
 
+def _get_secret(name: str) -> str | None:
+    """Read a setting from st.secrets, falling back to the environment variable.
+
+    Streamlit is imported lazily so db.py also works outside the Streamlit
+    runtime (see cli.py).
+    """
+    try:
+        import streamlit as st
+        return st.secrets[name]
+    except (ImportError, KeyError, FileNotFoundError):
+        return os.environ.get(name)
+
+
+@lru_cache(maxsize=4)
+def _client_for(url: str, key: str) -> Client:
+    return create_client(url, key)
+
+
 def _get_client() -> Client:
-    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    url, key = _get_secret("SUPABASE_URL"), _get_secret("SUPABASE_KEY")
+    if not url or not key:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+    return _client_for(url, key)
+
+
+def _fetch(query) -> tuple[list[dict], int]:
+    rows = query().execute().data
+    return rows, len(json.dumps(rows, default=str))
+
+
+def _read(key: tuple, query):
+    """Run a read query through the coalescing middleware and return its rows."""
+    rows, nbytes = coalesce.read(key, lambda: _fetch(query))
+    _payload_local.bytes = getattr(_payload_local, "bytes", 0) + nbytes
+    with _payload_lock:
+        PAYLOAD_STATS["reads"] += 1
+        PAYLOAD_STATS["bytes"] += nbytes
+    return rows
+
+
+def reset_payload_bytes() -> int:
+    """Return the bytes read by this thread since the last reset, and reset."""
+    nbytes = getattr(_payload_local, "bytes", 0)
+    _payload_local.bytes = 0
+    return nbytes
+
+
+def _write(query):
+    """Execute a write, start a new read generation and force fresh probes."""
+    global _write_epoch
+    try:
+        return query.execute()
+    finally:
+        coalesce.invalidate()
+        with _probe_lock:
+            _revisions.clear()
+            _write_epoch += 1
+
+
+def _probe_revision(scope: str) -> int | None:
+    """
+    Current revision of scope, or None when it has to be read in full (no
+    data_revisions row for it, or change detection unavailable).
+    """
+    global _probe_disabled_until
+    now = time.monotonic()
+    with _probe_lock:
+        if now < _probe_disabled_until:
+            return None
+        cached = _revisions.get(scope)
+        if cached is not None and now - cached[1] < PROBE_TTL_SECONDS:
+            return cached[0]
+        epoch = _write_epoch
+    scopes = sorted({"items", "checkpoints", scope})
+    try:
+        rows = _read(
+            ("probe_revisions", *scopes),
+            lambda: _get_client().table("data_revisions").select("scope,revision")
+            .in_("scope", scopes),
+        )
+    except Exception:
+        with _probe_lock:
+            _probe_disabled_until = now + PROBE_RETRY_SECONDS
+        return None
+    found = {row["scope"]: row["revision"] for row in rows}
+    with _probe_lock:
+        FETCH_STATS["probes"] += 1
+        if _write_epoch != epoch:
+            # A write finished while probing: these revisions may predate it
+            return None
+        if len(_revisions) > RESULT_CACHE_SIZE:
+            for name in [n for n, (_, at) in _revisions.items() if now - at >= PROBE_TTL_SECONDS]:
+                del _revisions[name]
+        for name in scopes:
+            _revisions[name] = (found.get(name), now)
+        return found.get(scope)
+
+
+def _cached_result(key: tuple, revision: int) -> list[dict] | None:
+    """Rows cached under key at revision, or None."""
+    with _probe_lock:
+        cached = _result_cache.get(key)
+        if cached is None or cached[0] != revision:
+            return None
+        _result_cache.move_to_end(key)
+        FETCH_STATS["skipped"] += 1
+        return cached[1]
+
+
+def _cache_result(key: tuple, revision: int, rows: list[dict]):
+    with _probe_lock:
+        _result_cache[key] = (revision, rows)
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+
+def _read_versioned(key: tuple, scope: str, query):
+    """Like _read, but reuse the last result if scope's revision hasn't changed."""
+    revision = _probe_revision(scope)
+    if revision is not None:
+        rows = _cached_result(key, revision)
+        if rows is not None:
+            return rows
+    rows = _read(key, query)
+    with _probe_lock:
+        FETCH_STATS["fetched"] += 1
+    if revision is not None:
+        _cache_result(key, revision, rows)
+    return rows
+
+
+def _iter_pages(table: str, columns: str = "*", key: str = "id") -> Iterator[list[dict]]:
+    """
+    Read a whole table in pages of at most PAGE_ROWS, keyset-paginated on the
+    unique column key (which columns must include). Ends on the first empty
+    page, so a server max-rows below PAGE_ROWS only means more requests.
+    """
+    last = None
+    while True:
+        def query(after=last):
+            q = _get_client().table(table).select(columns)
+            if after is not None:
+                q = q.gt(key, after)
+            return q.order(key).limit(PAGE_ROWS)
+
+        rows = _read(("page", table, columns, last), query)
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][key]
+
+
+def get_fetch_stats() -> dict:
+    """Counts of revision probes, skipped reads and full reads."""
+    with _probe_lock:
+        return dict(FETCH_STATS)
 
 
 def init_db():
@@ -53,31 +266,37 @@ def add_item(
         "status": status,
         "created_at": created_at,
     }
-    _get_client().table("items").insert(row).execute()
+    _write(_get_client().table("items").insert(row))
     return row
 
 
 def get_items(status: str | None = None, item_type: str | None = None) -> list[dict]:
-    q = _get_client().table("items").select("*")
-    if status:
-        q = q.eq("status", status)
-    if item_type:
-        q = q.eq("item_type", item_type)
-    q = q.order("created_at", desc=True)
-    return q.execute().data
+    def query():
+        q = _get_client().table("items").select("*")
+        if status:
+            q = q.eq("status", status)
+        if item_type:
+            q = q.eq("item_type", item_type)
+        return q.order("created_at", desc=True)
+
+    return _read_versioned(("get_items", status, item_type), "items", query)
 
 
 def get_item(item_id: str) -> dict | None:
-    resp = _get_client().table("items").select("*").eq("id", item_id).execute()
-    return resp.data[0] if resp.data else None
+    rows = _read_versioned(
+        ("get_item", item_id),
+        f"item:{item_id}",
+        lambda: _get_client().table("items").select("*").eq("id", item_id),
+    )
+    return rows[0] if rows else None
 
 
 def update_item_status(item_id: str, status: str):
-    _get_client().table("items").update({"status": status}).eq("id", item_id).execute()
+    _write(_get_client().table("items").update({"status": status}).eq("id", item_id))
 
 
 def delete_item(item_id: str):
-    _get_client().table("items").delete().eq("id", item_id).execute()
+    _write(_get_client().table("items").delete().eq("id", item_id))
 
 
 # ---- Checkpoints CRUD ----
@@ -101,85 +320,278 @@ def add_checkpoint(
         "notes": notes,
         "status": status,
     }
-    _get_client().table("checkpoints").insert(row).execute()
+    _write(_get_client().table("checkpoints").insert(row))
     return row
 
 
-def get_checkpoints(item_id: str, status: str | None = None) -> list[dict]:
-    q = _get_client().table("checkpoints").select("*").eq("item_id", item_id)
-    if status:
-        q = q.eq("status", status)
-    q = q.order("timestamp", desc=False)
-    return q.execute().data
+def get_checkpoints(
+    item_id: str, status: str | None = None, columns: str = FULL_COLUMNS
+) -> list[dict]:
+    def query():
+        q = _get_client().table("checkpoints").select(columns).eq("item_id", item_id)
+        if status:
+            q = q.eq("status", status)
+        return q.order("timestamp", desc=False)
+
+    return _read_versioned(
+        ("get_checkpoints", item_id, status, columns), f"item:{item_id}", query
+    )
 
 
-def get_all_checkpoints_for_items(item_ids: list[str]) -> dict[str, list[dict]]:
+def get_all_checkpoints_for_items(
+    item_ids: list[str], columns: str = FULL_COLUMNS
+) -> dict[str, list[dict]]:
     """Fetch checkpoints for multiple items in one query, grouped by item_id."""
     result: dict[str, list[dict]] = {iid: [] for iid in item_ids}
     if not item_ids:
         return result
-    resp = (
-        _get_client()
-        .table("checkpoints")
-        .select("*")
-        .in_("item_id", item_ids)
-        .order("timestamp", desc=False)
-        .execute()
+    rows = _read_versioned(
+        ("get_all_checkpoints_for_items", columns, *sorted(item_ids)),
+        "checkpoints",
+        lambda: (
+            _get_client()
+            .table("checkpoints")
+            .select(columns)
+            .in_("item_id", item_ids)
+            .order("timestamp", desc=False)
+        ),
     )
-    for row in resp.data:
+    for row in rows:
         result[row["item_id"]].append(row)
     return result
 
 
+def get_checkpoint_notes(item_id: str, cp_ids: list[str]) -> dict[str, str | None]:
+    """Fetch notes for just the given checkpoints of item_id, keyed by checkpoint id."""
+    if not cp_ids:
+        return {}
+    rows = _read_versioned(
+        ("get_checkpoint_notes", item_id, *sorted(cp_ids)),
+        f"item:{item_id}",
+        lambda: _get_client().table("checkpoints").select("id,notes").in_("id", cp_ids),
+    )
+    return {row["id"]: row["notes"] for row in rows}
+
+
+def get_item_estimations(
+    status: str | None = None,
+    item_types: list[str] | None = None,
+    now: datetime | None = None,
+) -> list[dict] | None:
+    """
+    List-view rows from the item_estimations() function
+    (migrations/004_item_estimations.sql) in one round trip: item columns plus
+    current, percent, remaining, speed, hours_remaining, eta, the completed
+    checkpoint series (cp_timestamps, cp_units) and, once migration 005 is
+    applied, the worker's current eta_quantiles, newest item first. Evaluated
+    at the server's clock unless now is given, so results are not
+    revision-cached. Returns None when the function is unavailable; callers
+    fall back to estimation.estimation_row() (retried after PROBE_RETRY_SECONDS).
+    """
+    global _rpc_disabled_until
+    if time.monotonic() < _rpc_disabled_until:
+        return None
+    params = {"p_status": status, "p_item_types": item_types}
+    if now is not None:
+        params["p_now"] = now.isoformat()
+    types_key = None if item_types is None else tuple(sorted(item_types))
+    try:
+        return _read(
+            ("item_estimations", status, types_key, params.get("p_now")),
+            lambda: _get_client().rpc("item_estimations", params),
+        )
+    except Exception:
+        _rpc_disabled_until = time.monotonic() + PROBE_RETRY_SECONDS
+        return None
+
+
 def update_checkpoint_timestamp(cp_id: str):
     """Set a checkpoint's timestamp to current UTC time without changing other fields."""
     now = datetime.now(timezone.utc).isoformat()
-    _get_client().table("checkpoints").update({"timestamp": now}).eq("id", cp_id).execute()
+    _write(_get_client().table("checkpoints").update({"timestamp": now}).eq("id", cp_id))
 
 
 def update_item_total(item_id: str, total_units: float):
-    _get_client().table("items").update({"total_units": total_units}).eq("id", item_id).execute()
+    _write(_get_client().table("items").update({"total_units": total_units}).eq("id", item_id))
 
 
 def update_checkpoint(cp_id: str, units_completed: float, timestamp: str, notes: str | None):
-    _get_client().table("checkpoints").update({
+    _write(_get_client().table("checkpoints").update({
         "units_completed": units_completed,
         "timestamp": timestamp,
         "notes": notes,
-    }).eq("id", cp_id).execute()
+    }).eq("id", cp_id))
 
 
 def delete_checkpoint(cp_id: str):
-    _get_client().table("checkpoints").delete().eq("id", cp_id).execute()
+    _write(_get_client().table("checkpoints").delete().eq("id", cp_id))
+
+
+def archive_checkpoints(archived: list[dict], rollups: list[dict], chunk_size: int = 200):
+    """
+    Apply rollup notes to the surviving rows, then move compacted checkpoints
+    into checkpoints_archive. Every step runs before the rows it depends on
+    are deleted (notes before the rows they absorb, archive rows before their
+    originals), so an interrupted run loses nothing and can be repeated:
+    plan_compaction() doesn't merge notes a survivor already carries.
+    """
+    client = _get_client()
+    for row in rollups:
+        _write(client.table("checkpoints").update({"notes": row["notes"]}).eq("id", row["id"]))
+    archived_at = datetime.now(timezone.utc).isoformat()
+    for start in range(0, len(archived), chunk_size):
+        chunk = archived[start:start + chunk_size]
+        rows = [
+            {
+                "id": cp["id"],
+                "item_id": cp["item_id"],
+                "units_completed": cp["units_completed"],
+                "timestamp": cp["timestamp"],
+                "notes": cp.get("notes"),
+                "status": cp.get("status", "completed"),
+                "rolled_into": cp.get("rolled_into"),
+                "archived_at": archived_at,
+            }
+            for cp in chunk
+        ]
+        _write(client.table("checkpoints_archive").upsert(rows))
+        _write(client.table("checkpoints").delete().in_("id", [cp["id"] for cp in chunk]))
 
 
 # ---- Export / Import ----
 
 
+def get_journal(after_seq: int = 0, limit: int = 10000) -> list[dict]:
+    """Journal entries with seq > after_seq, oldest first."""
+    return (
+        _get_client()
+        .table("journal")
+        .select("*")
+        .gt("seq", after_seq)
+        .order("seq", desc=False)
+        .limit(limit)
+        .execute()
+        .data
+    )
+
+
+def prune_journal(up_to_seq: int):
+    """Delete journal entries that are already in a backup."""
+    _get_client().table("journal").delete().lte("seq", up_to_seq).execute()
+
+
+# ---- Precomputed results ----
+
+
+def get_revisions() -> dict[str, int] | None:
+    """Every data_revisions scope, read page by page, or None if unavailable."""
+    try:
+        return {
+            row["scope"]: row["revision"]
+            for page in _iter_pages("data_revisions", "scope,revision", key="scope")
+            for row in page
+        }
+    except Exception:
+        return None
+
+
+def get_precomputed(item_id: str) -> dict | None:
+    """
+    The worker's row for item_id (estimation, eta_quantiles, chart), or None
+    when there is none that was computed at the item's current revision
+    within PRECOMPUTED_MAX_AGE_SECONDS. A row at the current revision is
+    kept in the result cache, a miss for PRECOMPUTED_MISS_TTL_SECONDS.
+    """
+    global _precomputed_disabled_until
+    revision = _probe_revision(f"item:{item_id}")
+    now = time.monotonic()
+    if revision is None or now < _precomputed_disabled_until:
+        return None
+    with _probe_lock:
+        miss = _precomputed_misses.get(item_id)
+    if miss is not None and miss[0] == revision and now - miss[1] < PRECOMPUTED_MISS_TTL_SECONDS:
+        return None
+    key = ("get_precomputed", item_id)
+    rows = _cached_result(key, revision)
+    if rows is None:
+        try:
+            rows = _read(
+                ("get_precomputed", item_id, revision),
+                lambda: _get_client().table("item_precomputed").select("*").eq("item_id", item_id),
+            )
+        except Exception:
+            _precomputed_disabled_until = time.monotonic() + PROBE_RETRY_SECONDS
+            return None
+        with _probe_lock:
+            FETCH_STATS["fetched"] += 1
+            if not rows or rows[0]["revision"] != revision:
+                _precomputed_misses[item_id] = (revision, now)
+                _precomputed_misses.move_to_end(item_id)
+                while len(_precomputed_misses) > RESULT_CACHE_SIZE:
+                    _precomputed_misses.popitem(last=False)
+                return None
+        _cache_result(key, revision, rows)
+    age = datetime.now(timezone.utc) - parse_dt(rows[0]["computed_at"])
+    return rows[0] if age.total_seconds() <= PRECOMPUTED_MAX_AGE_SECONDS else None
+
+
+def get_precomputed_revisions() -> dict[str, int]:
+    """Revision each item was last precomputed at, keyed by item id."""
+    rows = _get_client().table("item_precomputed").select("item_id,revision").execute().data
+    return {row["item_id"]: row["revision"] for row in rows}
+
+
+def save_precomputed(rows: list[dict]):
+    """Upsert worker results. Derived data, so not journaled."""
+    if rows:
+        _get_client().table("item_precomputed").upsert(rows, on_conflict="item_id").execute()
+
+
+def iter_export() -> tuple[Iterator[list[dict]], Iterator[list[dict]]]:
+    """
+    Pages of items and of checkpoints for a full export, PAGE_ROWS at a time,
+    so no single response hits the server's max-rows limit. Consume the items
+    first: pages aren't one consistent snapshot, so checkpoints of items
+    created after the items were read are left out, and the export imports
+    cleanly.
+    """
+    exported: set[str] = set()
+
+    def items():
+        for page in _iter_pages("items"):
+            exported.update(row["id"] for row in page)
+            yield page
+
+    def checkpoints():
+        for page in _iter_pages("checkpoints"):
+            page = [row for row in page if row["item_id"] in exported]
+            if page:
+                yield page
+
+    return items(), checkpoints()
+
+
 def export_all() -> dict:
-    client = _get_client()
-    items = client.table("items").select("*").execute().data
-    checkpoints = client.table("checkpoints").select("*").execute().data
-    return {"items": items, "checkpoints": checkpoints}
+    items, checkpoints = iter_export()
+    return {
+        "items": [row for page in items for row in page],
+        "checkpoints": [row for page in checkpoints for row in page],
+    }
 
 
 def _is_legacy_format(data: dict) -> bool:
     return "books" in data and isinstance(data["books"], list)
 
 
-def import_all(data: dict):
-    """Import data, auto-detecting legacy format."""
-    if _is_legacy_format(data):
-        from migration import convert_legacy
-        data = convert_legacy(data)
-
+def clear_all():
+    """Delete all existing data (checkpoints first due to FK constraint)."""
     client = _get_client()
+    _write(client.table("checkpoints").delete().neq("id", ""))
+    _write(client.table("items").delete().neq("id", ""))
 
-    # Delete all existing data (checkpoints first due to FK constraint)
-    client.table("checkpoints").delete().neq("id", "").execute()
-    client.table("items").delete().neq("id", "").execute()
 
-    # Insert items
+def insert_items(items: list[dict]):
+    """Bulk-insert items from export rows in one request."""
     item_rows = [
         {
             "id": item["id"],
@@ -190,22 +602,53 @@ def import_all(data: dict):
             "status": item.get("status", "active"),
             "created_at": item["created_at"],
         }
-        for item in data.get("items", [])
+        for item in items
     ]
     if item_rows:
-        client.table("items").insert(item_rows).execute()
+        _write(_get_client().table("items").insert(item_rows))
+
 
-    # Insert checkpoints
+def insert_checkpoints(checkpoints: list[dict]):
+    """Bulk-insert checkpoints in one request; id and timestamp default like add_checkpoint."""
+    now = datetime.now(timezone.utc).isoformat()
     cp_rows = [
         {
-            "id": cp["id"],
+            "id": cp.get("id") or str(uuid.uuid4()),
             "item_id": cp["item_id"],
             "units_completed": cp["units_completed"],
-            "timestamp": cp["timestamp"],
+            "timestamp": cp.get("timestamp") or now,
             "notes": cp.get("notes"),
             "status": cp.get("status", "completed"),
         }
-        for cp in data.get("checkpoints", [])
+        for cp in checkpoints
     ]
     if cp_rows:
-        client.table("checkpoints").insert(cp_rows).execute()
+        _write(_get_client().table("checkpoints").insert(cp_rows))
+
+
+def update_items_status(item_ids: list[str], status: str):
+    """Set the status of many items in one request."""
+    if status not in STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    if item_ids:
+        _write(_get_client().table("items").update({"status": status}).in_("id", item_ids))
+
+
+def import_all(data: dict, batch_size: int | None = None):
+    """Import data, auto-detecting legacy format.
+
+    With batch_size, rows are inserted in chunks of that many per request.
+    """
+    if _is_legacy_format(data):
+        from migration import convert_legacy
+        data = convert_legacy(data)
+
+    clear_all()
+
+    items = data.get("items", [])
+    checkpoints = data.get("checkpoints", [])
+    step = batch_size or max(len(items), len(checkpoints), 1)
+    for start in range(0, len(items), step):
+        insert_items(items[start:start + step])
+    for start in range(0, len(checkpoints), step):
+        insert_checkpoints(checkpoints[start:start + step])
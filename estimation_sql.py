@@ -0,0 +1,326 @@
+"""
+SQLite twin of the item_estimations() database function, plus parity checks.
+
+migrations/004_item_estimations.sql (as redefined by
+005_item_precomputed.sql) computes the list-view estimation rows in
+Postgres. ITEM_ESTIMATIONS_SQL below is the same query for SQLite; it
+backs LocalBackend.rpc() (local_backend.py) and lets the SQL be checked
+offline. check_parity() compares both SQL implementations against the
+Python estimator (estimation.estimation_row) for every status / type filter
+on a data set, with synthetic edge cases by default:
+
+    python cli.py check-estimations                  # SQLite vs Python, synthetic data
+    python cli.py check-estimations --input backup.json
+    python cli.py check-estimations --live           # also the Supabase function
+"""
+import json
+import math
+import random
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse as parse_dt
+
+from db import ITEM_TYPES, PRECOMPUTED_MAX_AGE_SECONDS, STATUSES
+from estimation import estimation_row
+
+REL_TOL = 1e-6
+ETA_TOL_SECONDS = 0.002  # SQLite date functions keep milliseconds
+
+ITEM_ESTIMATIONS_SQL = """
+with filtered as (
+    select * from items
+    where (:status is null or status = :status)
+      and (:item_types is null or item_type in (select value from json_each(:item_types)))
+),
+completed as (
+    select
+        c.item_id,
+        c.units_completed as units,
+        row_number() over w as rn,
+        count(*) over w_all as n,
+        (julianday(first_value(c."timestamp") over w_all) - 2440587.5) * 86400.0 as t0,
+        json_group_array(c."timestamp") over w_all as cp_timestamps,
+        json_group_array(c.units_completed) over w_all as cp_units
+    from checkpoints c
+    where c.status = 'completed'
+      and c.item_id in (select id from filtered)
+    window w as (partition by c.item_id order by c."timestamp"),
+           w_all as (w rows between unbounded preceding and unbounded following)
+),
+est as (
+    select
+        f.*,
+        coalesce(l.units, 0) * 1.0 as cur,
+        coalesce(l.n, 0) as n,
+        (:now - l.t0) / 3600.0 as elapsed_hours,
+        coalesce(l.cp_timestamps, '[]') as cp_ts,
+        coalesce(l.cp_units, '[]') as cp_u
+    from filtered f
+    left join completed l on l.item_id = f.id and l.rn = l.n
+),
+spd as (
+    select
+        est.*,
+        case when n >= 2 then max(
+            case when elapsed_hours > 0 then cur / elapsed_hours else 0.001 end,
+            0.001
+        ) end as spd
+    from est
+)
+select
+    s.id,
+    s.name,
+    s.item_type,
+    s.unit_type,
+    s.total_units,
+    s.status,
+    s.created_at,
+    s.cur as "current",
+    case when s.total_units > 0 then s.cur / s.total_units * 100 else 0 end as percent,
+    s.total_units - s.cur as remaining,
+    s.spd as speed,
+    (s.total_units - s.cur) / s.spd as hours_remaining,
+    strftime(
+        '%Y-%m-%dT%H:%M:%f+00:00', :now + (s.total_units - s.cur) / s.spd * 3600, 'unixepoch'
+    ) as eta,
+    s.cp_ts as cp_timestamps,
+    s.cp_u as cp_units,
+    p.eta_quantiles
+from spd s
+left join data_revisions r on r.scope = 'item:' || s.id
+left join item_precomputed p
+    on p.item_id = s.id
+   and p.revision = coalesce(r.revision, 0)
+   and (julianday(p.computed_at) - 2440587.5) * 86400.0 >= :now - :max_age
+order by s.created_at desc
+"""
+
+_SCHEMA = """
+create table items (
+    id text primary key, name text, item_type text, unit_type text,
+    total_units real, status text, created_at text
+);
+create table checkpoints (
+    id text primary key, item_id text, units_completed real, "timestamp" text,
+    notes text, status text
+);
+create table data_revisions (scope text primary key, revision integer);
+create table item_precomputed (
+    item_id text primary key, revision integer, computed_at text, eta_quantiles text
+);
+"""
+
+_ITEM_COLUMNS = ("id", "name", "item_type", "unit_type", "total_units", "status", "created_at")
+_CP_COLUMNS = ("id", "item_id", "units_completed", "timestamp", "notes", "status")
+
+
+def sqlite_item_estimations(
+    data: dict,
+    status: str | None = None,
+    item_types: list[str] | None = None,
+    now: datetime | None = None,
+    max_age_seconds: float = PRECOMPUTED_MAX_AGE_SECONDS,
+) -> list[dict]:
+    """
+    Run ITEM_ESTIMATIONS_SQL over {"items", "checkpoints"} (and, if present,
+    "data_revisions" and "item_precomputed") in an in-memory database.
+    """
+    now = now or datetime.now(timezone.utc)
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.executescript(_SCHEMA)
+        conn.executemany(
+            "insert into items values (?, ?, ?, ?, ?, ?, ?)",
+            [tuple(item.get(c) for c in _ITEM_COLUMNS) for item in data["items"]],
+        )
+        conn.executemany(
+            "insert into checkpoints values (?, ?, ?, ?, ?, ?)",
+            [tuple(cp.get(c) for c in _CP_COLUMNS) for cp in data["checkpoints"]],
+        )
+        conn.executemany(
+            "insert into data_revisions values (?, ?)",
+            [(r["scope"], r["revision"]) for r in data.get("data_revisions", [])],
+        )
+        conn.executemany(
+            "insert into item_precomputed values (?, ?, ?, ?)",
+            [
+                (p["item_id"], p["revision"], p["computed_at"], json.dumps(p["eta_quantiles"]))
+                for p in data.get("item_precomputed", [])
+                if p.get("eta_quantiles") is not None
+            ],
+        )
+        conn.row_factory = sqlite3.Row
+        cursor = conn.execute(ITEM_ESTIMATIONS_SQL, {
+            "status": status,
+            "item_types": None if item_types is None else json.dumps(list(item_types)),
+            "now": now.timestamp(),
+            "max_age": max_age_seconds,
+        })
+        rows = [dict(row) for row in cursor]
+    finally:
+        conn.close()
+    for row in rows:
+        row["cp_timestamps"] = json.loads(row["cp_timestamps"])
+        row["cp_units"] = [float(u) for u in json.loads(row["cp_units"])]
+        if row["eta_quantiles"] is not None:
+            row["eta_quantiles"] = json.loads(row["eta_quantiles"])
+    return rows
+
+
+def python_item_estimations(
+    data: dict,
+    status: str | None = None,
+    item_types: list[str] | None = None,
+    now: datetime | None = None,
+) -> list[dict]:
+    """Reference rows from estimation.py, read in the same order db.py reads them."""
+    now = now or datetime.now(timezone.utc)
+    by_item: dict[str, list[dict]] = {}
+    for cp in sorted(data["checkpoints"], key=lambda cp: cp["timestamp"]):
+        by_item.setdefault(cp["item_id"], []).append(cp)
+    items = [
+        item for item in data["items"]
+        if (status is None or item["status"] == status)
+        and (item_types is None or item["item_type"] in item_types)
+    ]
+    items.sort(key=lambda item: item["created_at"], reverse=True)
+    return [estimation_row(item, by_item.get(item["id"], []), now) for item in items]
+
+
+# ---- Parity ----
+
+
+def _close(a, b, rel_tol: float = REL_TOL) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(float(a), float(b), rel_tol=rel_tol, abs_tol=1e-9)
+
+
+def compare_rows(
+    expected: list[dict], actual: list[dict], now: datetime, label: str
+) -> list[str]:
+    """Describe every difference between two item_estimations() results."""
+    problems = []
+    exp_ids = [row["id"] for row in expected]
+    act_ids = [row["id"] for row in actual]
+    if exp_ids != act_ids:
+        if sorted(exp_ids) != sorted(act_ids):
+            return [f"{label}: item sets differ ({len(exp_ids)} vs {len(act_ids)} rows)"]
+        problems.append(f"{label}: rows in a different order")
+
+    actual_by_id = {row["id"]: row for row in actual}
+    for exp in expected:
+        act = actual_by_id[exp["id"]]
+        where = f"{label} item {exp['id']}"
+        rel_tol = REL_TOL
+        if exp["speed"] is not None:
+            # Speed divides by the time since the first checkpoint, which
+            # magnifies timestamp rounding when that time is short
+            elapsed = abs((now - parse_dt(exp["cp_timestamps"][0])).total_seconds())
+            rel_tol += ETA_TOL_SECONDS / max(elapsed, ETA_TOL_SECONDS)
+        for key in ("current", "percent", "remaining"):
+            if not _close(exp[key], act[key]):
+                problems.append(f"{where}: {key} {exp[key]!r} != {act[key]!r}")
+        for key in ("speed", "hours_remaining"):
+            if not _close(exp[key], act[key], rel_tol):
+                problems.append(f"{where}: {key} {exp[key]!r} != {act[key]!r}")
+        if (exp["eta"] is None) != (act["eta"] is None):
+            problems.append(f"{where}: eta {exp['eta']!r} != {act['eta']!r}")
+        elif exp["eta"] is not None:
+            diff = abs((parse_dt(exp["eta"]) - parse_dt(act["eta"])).total_seconds())
+            tol = ETA_TOL_SECONDS + rel_tol * abs(exp["hours_remaining"]) * 3600
+            if diff > tol:
+                problems.append(f"{where}: eta {exp['eta']} != {act['eta']} ({diff:.3f}s)")
+        if [parse_dt(t) for t in exp["cp_timestamps"]] != [
+            parse_dt(t) for t in act["cp_timestamps"]
+        ]:
+            problems.append(f"{where}: cp_timestamps differ")
+        if len(exp["cp_units"]) != len(act["cp_units"]) or not all(
+            _close(a, b) for a, b in zip(exp["cp_units"], act["cp_units"])
+        ):
+            problems.append(f"{where}: cp_units differ")
+    return problems
+
+
+def _filters() -> list[tuple[str | None, list[str] | None]]:
+    statuses = [None, *STATUSES]
+    type_sets = [None, list(ITEM_TYPES), [ITEM_TYPES[0]], list(ITEM_TYPES[1:3]), []]
+    return [(status, types) for status in statuses for types in type_sets]
+
+
+def check_parity(data: dict, now: datetime | None = None, live: bool = False) -> list[str]:
+    """
+    Compare the SQLite query (and with live, the installed Supabase function)
+    against the Python estimator for every filter combination.
+    Returns the list of mismatches; empty means parity.
+    """
+    from db import get_item_estimations
+
+    now = now or datetime.now(timezone.utc)
+    problems = []
+    for status, types in _filters():
+        label = f"status={status} types={types}"
+        expected = python_item_estimations(data, status, types, now)
+        problems += compare_rows(
+            expected, sqlite_item_estimations(data, status, types, now), now, f"sqlite {label}"
+        )
+        if live:
+            actual = get_item_estimations(status, types, now=now)
+            if actual is None:
+                return problems + ["live: item_estimations() is not installed or failed"]
+            problems += compare_rows(expected, actual, now, f"live {label}")
+    return problems
+
+
+def parity_dataset(n_items: int = 200, seed: int = 0, now: datetime | None = None) -> dict:
+    """
+    Random items plus edge cases: no checkpoints, a single checkpoint, only
+    non-completed checkpoints, finished and over-finished items, a first
+    checkpoint at `now` or in the future, and shrinking progress.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    items, checkpoints = [], []
+
+    def add(cps: list[tuple[float, float, str]], total: float | None = None):
+        item_id = str(uuid.uuid4())
+        items.append({
+            "id": item_id,
+            "name": f"Parity {len(items)}",
+            "item_type": rng.choice(ITEM_TYPES),
+            "unit_type": "pages",
+            "total_units": total if total is not None else float(rng.randint(1, 2000)),
+            "status": rng.choice(STATUSES),
+            "created_at": (now - timedelta(days=400, seconds=len(items))).isoformat(),
+        })
+        for hours_ago, units, status in cps:
+            checkpoints.append({
+                "id": str(uuid.uuid4()),
+                "item_id": item_id,
+                "units_completed": units,
+                "timestamp": (now - timedelta(hours=hours_ago)).isoformat(),
+                "notes": None,
+                "status": status,
+            })
+
+    add([])
+    add([(5.0, 0, "completed")])
+    add([(5.0, 0, "draft"), (2.0, 10, "draft")])
+    add([(30.0, 0, "completed"), (1.0, 100.0, "completed")], total=100.0)
+    add([(30.0, 0, "completed"), (1.0, 150.0, "completed")], total=100.0)
+    add([(0.0, 0, "completed"), (0.0 - 1e-3, 3, "completed")])
+    add([(-2.0, 0, "completed"), (-3.0, 5, "completed")])
+    add([(48.0, 40, "completed"), (24.0, 10, "completed"), (3.0, 0.5, "draft")])
+    add([(10.0, 0, "completed"), (5.0, 7, "completed")], total=0.5)
+
+    for _ in range(n_items):
+        n = rng.choice([0, 1, 2, 3, 10, 40])
+        hours = sorted((rng.uniform(0, 24 * 365) for _ in range(n)), reverse=True)
+        units, cps = 0.0, []
+        for h in hours:
+            units += rng.choice([0, rng.randint(1, 50), rng.uniform(0, 30)])
+            cps.append((h, units, "completed" if rng.random() > 0.1 else "draft"))
+        add(cps)
+    return {"items": items, "checkpoints": checkpoints}
@@ -0,0 +1,186 @@
+"""
+Incremental backups and point-in-time restore from the operation journal.
+
+The journal (migrations/003_journal.sql) is filled by triggers on items and
+checkpoints (migrations/006_journal_trigger.sql) with row images: upsert_item
+/ upsert_checkpoint carry the full row, delete_item / delete_checkpoint the id.
+
+A backup directory holds:
+    manifest.json                      bases, segments and the last backed-up seq
+    base-<seq>.ltsnap                  full snapshot (snapshot.py) covering seq <= <seq>
+    journal-<first>-<last>.jsonl.gz    journal entries first..last, one JSON per line
+
+incremental_backup() exports journal entries in seq order, but only those
+older than SETTLE_SECONDS: seqs are handed out when a row is written, not
+when its transaction commits, so a newer entry can be visible before an older
+one. Once an entry is SETTLE_SECONDS old, every transaction that could still
+commit a lower seq has finished (keep it above the database's
+statement_timeout), so the cursor never skips an entry and pruning up to it
+never deletes one that wasn't backed up.
+
+The first run takes a base snapshot of the live tables. Later bases are built
+by replaying the backed-up entries onto the previous base every
+BASE_EVERY_ENTRIES seqs, so they match their seq exactly and a restore never
+replays more than that many entries. restore() loads the newest base taken
+at or before the requested time and replays the later entries up to it.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse as parse_dt
+
+from db import export_all, get_journal, prune_journal
+from snapshot import read_snapshot, write_snapshot
+
+SEGMENT_MAX_ENTRIES = 10000
+BASE_EVERY_ENTRIES = 100000
+SETTLE_SECONDS = 300
+MANIFEST = "manifest.json"
+
+
+def _load_manifest(backup_dir: str) -> dict:
+    path = os.path.join(backup_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"last_seq": 0, "bases": [], "segments": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(backup_dir: str, manifest: dict):
+    path = os.path.join(backup_dir, MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _write_base(backup_dir: str, manifest: dict, data: dict, ts: str):
+    seq = manifest["last_seq"]
+    name = f"base-{seq:012d}.ltsnap"
+    write_snapshot(data, os.path.join(backup_dir, name))
+    manifest["bases"].append({"file": name, "seq": seq, "ts": ts})
+
+
+def _write_segment(backup_dir: str, entries: list[dict]) -> dict:
+    first, last = entries[0]["seq"], entries[-1]["seq"]
+    name = f"journal-{first:012d}-{last:012d}.jsonl.gz"
+    with gzip.open(os.path.join(backup_dir, name), "wt", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    # ts is the transaction start, so it isn't monotonic in seq
+    times = sorted(entry["ts"] for entry in entries)
+    return {"file": name, "first_seq": first, "last_seq": last,
+            "first_ts": times[0], "last_ts": times[-1]}
+
+
+def _settled(entries: list[dict], cutoff: datetime) -> list[dict]:
+    """The leading entries written at or before cutoff."""
+    for i, entry in enumerate(entries):
+        if parse_dt(entry["ts"]) > cutoff:
+            return entries[:i]
+    return entries
+
+
+def incremental_backup(backup_dir: str, prune: bool = False) -> dict:
+    """
+    Export settled journal entries added since the last backup, rotating in
+    a new base snapshot when needed. With prune, backed-up entries are
+    deleted from the journal table afterwards. Returns counts of what was
+    written.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    manifest = _load_manifest(backup_dir)
+    stats = {"entries": 0, "segments": 0, "bases": 0}
+
+    if not manifest["bases"]:
+        # Live tables: entries after last_seq are replayed on top, and every
+        # entry sets absolute values, so changes made during the export are
+        # put right by the replay
+        data = export_all()
+        _write_base(backup_dir, manifest, data, datetime.now(timezone.utc).isoformat())
+        stats["bases"] += 1
+        _save_manifest(backup_dir, manifest)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS)
+    while True:
+        entries = _settled(get_journal(manifest["last_seq"], SEGMENT_MAX_ENTRIES), cutoff)
+        if not entries:
+            break
+        manifest["segments"].append(_write_segment(backup_dir, entries))
+        manifest["last_seq"] = entries[-1]["seq"]
+        stats["entries"] += len(entries)
+        stats["segments"] += 1
+        _save_manifest(backup_dir, manifest)
+
+    base = manifest["bases"][-1]
+    if manifest["last_seq"] - base["seq"] >= BASE_EVERY_ENTRIES:
+        ts = max(
+            [base["ts"]]
+            + [s["last_ts"] for s in manifest["segments"] if s["last_seq"] > base["seq"]],
+            key=parse_dt,
+        )
+        _write_base(backup_dir, manifest, restore(backup_dir, parse_dt(ts)), ts)
+        stats["bases"] += 1
+        _save_manifest(backup_dir, manifest)
+
+    if prune:
+        prune_journal(manifest["last_seq"])
+    return stats
+
+
+# ---- Replay ----
+
+
+def _apply(state: dict, entry: dict):
+    """Apply one journal entry to {"items": {id: row}, "checkpoints": {id: row}}."""
+    items, cps = state["items"], state["checkpoints"]
+    op, args = entry["op"], entry["args"]
+    if op == "upsert_item":
+        items[args["id"]] = dict(args)
+    elif op == "delete_item":
+        items.pop(args["id"], None)
+    elif op == "upsert_checkpoint":
+        cps[args["id"]] = {"notes": None, **args}
+    elif op == "delete_checkpoint":
+        cps.pop(args["id"], None)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+
+def _iter_segment(backup_dir: str, segment: dict):
+    with gzip.open(os.path.join(backup_dir, segment["file"]), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def restore(backup_dir: str, at: datetime | None = None) -> dict:
+    """
+    Rebuild the data as of `at` (default: latest backed-up state) in the
+    export format, ready for import_all().
+    """
+    manifest = _load_manifest(backup_dir)
+    at = at or datetime.now(timezone.utc)
+    bases = [b for b in manifest["bases"] if parse_dt(b["ts"]) <= at]
+    if not bases:
+        raise ValueError(f"No base snapshot at or before {at.isoformat()}")
+    base = bases[-1]
+
+    data = read_snapshot(os.path.join(backup_dir, base["file"]))
+    state = {
+        "items": {item["id"]: item for item in data["items"]},
+        "checkpoints": {cp["id"]: cp for cp in data["checkpoints"]},
+    }
+    for segment in manifest["segments"]:
+        if segment["last_seq"] <= base["seq"] or parse_dt(segment["first_ts"]) > at:
+            continue
+        for entry in _iter_segment(backup_dir, segment):
+            if entry["seq"] <= base["seq"]:
+                continue
+            if parse_dt(entry["ts"]) <= at:
+                _apply(state, entry)
+    return {
+        "items": list(state["items"].values()),
+        "checkpoints": list(state["checkpoints"].values()),
+    }
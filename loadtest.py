@@ -0,0 +1,459 @@
+"""
+Concurrent-session load test for app.py.
+
+Serves app.py from a real `streamlit run` server (this file, re-run by
+Streamlit, installs the in-memory LocalBackend from local_backend.py and then
+runs app.py) and drives N simulated browser sessions over Streamlit's
+websocket protocol at the same time. Reruns of different sessions overlap and
+share the server's db.py caches, as in production, and a widget inside a
+fragment reruns only that fragment, as in a browser.
+
+Reports rerun latency percentiles, time to first render (and to log in, with
+--password), backend calls and payload bytes per rerun, how many reruns were
+fragment-only, coalesced reads, server memory (RSS) growth per session and
+session-state size per session (ui_state.session_report()). With --steps, a
+single session reports backend calls for each interaction.
+
+Each server is warmed up with one untimed session first, so imports and
+first-use costs are not counted. Widget values are sent in the encoding of
+the installed Streamlit version (BackMsg / WidgetStates protos); the client
+needs the websockets package, a Streamlit dependency.
+
+Usage:
+    python loadtest.py --sessions 20 --latency-ms 40 --jitter-ms 10
+    python loadtest.py --sessions 20 --password secret   # time the login gate too
+    python loadtest.py --sessions 20 --precompute        # read worker.py results
+    python loadtest.py --steps                           # backend calls per interaction
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import runpy
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import streamlit as st
+from streamlit import runtime
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+import coalesce
+import db
+import ui_state
+from local_backend import LocalBackend
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+BACKEND_ENV = "LOADTEST_BACKEND"
+STATS_QUERY = "loadtest=stats"
+SERVER_START_SECONDS = 30.0
+
+# WidgetState field each widget type sends its value in
+_VALUE_FIELDS = {
+    "checkbox": "bool_value",
+    "number_input": "double_value",
+    "radio": "string_value",
+    "selectbox": "string_value",
+    "text_input": "string_value",
+}
+_RUN_ENDED = {
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_WITH_COMPILE_ERROR,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+}
+
+
+# ---- Server side (this file run by `streamlit run`) ----
+
+
+def _rss_bytes() -> int | None:
+    """Resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def _backend() -> LocalBackend:
+    """One seeded backend per server, configured by the driver through BACKEND_ENV."""
+    config = json.loads(os.environ[BACKEND_ENV])
+    backend = LocalBackend(config["latency_ms"], config["jitter_ms"], seed=config["seed"])
+    backend.seed(config["items"], config["checkpoints"], seed=config["seed"])
+    db._get_client = lambda: backend
+    if config["precompute"]:
+        import worker
+        worker.run(once=True)
+        backend.calls = 0
+    return backend
+
+
+def _serve():
+    """Script run of the server: a stats report for the driver, or app.py."""
+    backend = _backend()
+    db._get_client = lambda: backend
+    if st.query_params.get("loadtest") == "stats":
+        gc.collect()
+        st.text(json.dumps({
+            "calls": backend.calls,
+            "coalesced": coalesce.get_metrics()["coalesced"],
+            "payload_bytes": db.PAYLOAD_STATS["bytes"],
+            "skipped": db.get_fetch_stats()["skipped"],
+            "rss": _rss_bytes(),
+            "state_sizes": ui_state.session_report(),
+        }))
+        return
+    runpy.run_path(APP_PATH, run_name="__main__")
+
+
+# ---- Driver side ----
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class Session:
+    """One simulated browser tab: a websocket connection plus its timing samples."""
+
+    def __init__(self, url: str, rng: random.Random, timeout: float,
+                 password: str | None = None, query_string: str = ""):
+        self.url = url
+        self.rng = rng
+        self.timeout = timeout
+        self.password = password
+        self.query_string = query_string
+        self.ws = None
+        self.session_id: str | None = None
+        # Widgets on screen: widget id -> (element type, fragment id, proto)
+        self.widgets: dict[str, tuple[str, str, object]] = {}
+        self.texts: list[str] = []
+        self._form_values: dict[str, list[WidgetState]] = {}
+        self.first_run: float | None = None
+        self.login: float | None = None
+        self.reruns: list[float] = []
+        self.fragment_reruns = 0
+        self.errors: list[str] = []
+        self.completed = False
+        self.after_step = None  # async callback(step name, fragment_only), for --steps
+
+    async def connect(self):
+        from websockets.asyncio.client import connect
+
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _rerun(self, widgets: list[WidgetState], fragment_id: str) -> bool:
+        """Request a rerun and read messages until it ends; True if no full run happened."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.widget_states.widgets.extend(widgets)
+        msg.rerun_script.fragment_id = fragment_id
+        await self.ws.send(msg.SerializeToString())
+        fragment_only = True
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = fwd.new_session.initialize.session_id or self.session_id
+                rerun_ids = set(fwd.new_session.fragment_ids_this_run)
+                if not rerun_ids:
+                    fragment_only = False
+                self.widgets = {
+                    widget_id: widget for widget_id, widget in self.widgets.items()
+                    if rerun_ids and widget[1] not in rerun_ids
+                }
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype == "exception":
+                    self.errors.append(element.exception.message)
+                elif etype == "text":
+                    self.texts.append(element.text.body)
+                proto = getattr(element, etype) if etype else None
+                if getattr(proto, "id", ""):
+                    self.widgets[proto.id] = (etype, fwd.delta.fragment_id, proto)
+            elif kind == "script_finished" and fwd.script_finished in _RUN_ENDED:
+                return fragment_only
+
+    def _find(self, etype: str, key: str | None = None, label: str | None = None,
+              key_prefix: str | None = None) -> tuple[str, str, object]:
+        """First widget on screen of type etype matching the given key/label."""
+        for widget_id, (kind, fragment_id, proto) in self.widgets.items():
+            if kind != etype:
+                continue
+            if key is not None and not widget_id.endswith(f"-{key}"):
+                continue
+            if key_prefix is not None and f"-{key_prefix}" not in widget_id:
+                continue
+            if label is not None and proto.label != label:
+                continue
+            return widget_id, fragment_id, proto
+        raise LookupError(f"no {etype} on screen with key={key} label={label} prefix={key_prefix}")
+
+    async def _step(self, name: str, widgets: list[WidgetState], fragment_id: str = "",
+                    first: bool = False, login: bool = False):
+        start = time.perf_counter()
+        fragment_only = await asyncio.wait_for(self._rerun(widgets, fragment_id), self.timeout)
+        elapsed = time.perf_counter() - start
+        if first:
+            self.first_run = elapsed
+        if login:
+            self.login = elapsed
+        self.reruns.append(elapsed)
+        self.fragment_reruns += fragment_only
+        if self.after_step is not None:
+            await self.after_step(name, fragment_only)
+
+    def fill(self, etype: str, value, **match):
+        """Type into a form widget; the value is sent when the form is submitted."""
+        widget_id, _, proto = self._find(etype, **match)
+        state = WidgetState(id=widget_id, **{_VALUE_FIELDS[etype]: value})
+        self._form_values.setdefault(proto.form_id, []).append(state)
+
+    async def set_value(self, name: str, etype: str, value, **match):
+        widget_id, fragment_id, _ = self._find(etype, **match)
+        state = WidgetState(id=widget_id, **{_VALUE_FIELDS[etype]: value})
+        await self._step(name, [state], fragment_id)
+
+    async def click(self, name: str, extra: list[WidgetState] = (), login: bool = False,
+                    **match):
+        widget_id, fragment_id, proto = self._find("button", **match)
+        form_values = self._form_values.pop(proto.form_id, []) if proto.form_id else []
+        widgets = [*extra, *form_values, WidgetState(id=widget_id, trigger_value=True)]
+        await self._step(name, widgets, fragment_id, login=login)
+
+    async def run_flow(self):
+        """Run the scripted flow; a failure is recorded in errors and ends it."""
+        try:
+            await self.connect()
+            await self._flow()
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+        else:
+            self.completed = not self.errors
+
+    async def _flow(self):
+        await self._step("first render", [], first=True)
+        if self.password:
+            # First render is the login gate; logging in renders the app in the same run
+            widget_id, _, _ = self._find("text_input", key="auth_password_input")
+            password = WidgetState(id=widget_id, string_value=self.password)
+            await self.click("log in", extra=[password], login=True, key="auth_login_btn")
+
+        # List filtering
+        _, _, radio = self._find("radio", label="Category")
+        await self.set_value("filter status", "radio", radio.options[1], label="Category")
+        await self.set_value("uncheck type", "checkbox", False, key="filter_book")
+        await self.set_value("check type", "checkbox", True, key="filter_book")
+        await self.set_value("filter status", "radio", radio.options[0], label="Category")
+
+        # Open details
+        details = [w for w, (kind, _, _) in self.widgets.items()
+                   if kind == "button" and w.endswith(":detail")]
+        item_id = self.rng.choice(details).rsplit("-ui:item:", 1)[1].removesuffix(":detail")
+        await self.click("open details", key=f"ui:item:{item_id}:detail")
+
+        # Add a checkpoint
+        self.fill("text_input", str(self.rng.randint(1, 5)), key="cp_value_input")
+        await self.click("add checkpoint", label="+ Add")
+
+        # Edit the total
+        await self.click("edit total", key=f"ui:item:{item_id}:edit_total")
+        new_total = float(self.rng.randint(1000, 2000))
+        await self.set_value("type total", "number_input", new_total,
+                             key=f"ui:item:{item_id}:new_total")
+        await self.click("save total", key=f"ui:item:{item_id}:save_total")
+
+        # Checkpoint row: edit toggle, cancel, set to now
+        await self.click("edit checkpoint", label="Edit", key_prefix="ui:cp:")
+        await self.click("cancel edit", label="Cancel", key_prefix="ui:cp:")
+        await self.click("set to now", label="\U0001F504")
+
+        await self.click("back to list", label="← Back to List")
+
+    async def stats(self) -> dict:
+        """Server counters, read through a one-off stats session."""
+        stats = Session(self.url, self.rng, self.timeout, query_string=STATS_QUERY)
+        await stats.connect()
+        try:
+            await asyncio.wait_for(stats._rerun([], ""), self.timeout)
+        finally:
+            await stats.close()
+        return json.loads(stats.texts[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int, config: dict, password: str | None) -> subprocess.Popen:
+    env = dict(os.environ, **{BACKEND_ENV: json.dumps(config)})
+    if password:
+        env["TRACKER_PASSWORD"] = password
+    else:
+        env.pop("TRACKER_PASSWORD", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.abspath(__file__),
+         "--server.headless=true", f"--server.port={port}", "--server.address=127.0.0.1",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit server did not start")
+
+
+async def _drive(url: str, sessions: int, seed: int, timeout: float,
+                 password: str | None, steps: bool) -> dict:
+    warmup = Session(url, random.Random(seed - 1), timeout, password)
+    await warmup.run_flow()
+    await warmup.close()
+    if warmup.errors:
+        raise RuntimeError(f"warm-up session failed: {warmup.errors[0]}")
+
+    users = [Session(url, random.Random(seed + n), timeout, password) for n in range(sessions)]
+    step_calls: list[tuple[str, bool, int]] = []
+    if steps:
+        last = [(await warmup.stats())["calls"]]
+
+        async def after_step(name: str, fragment_only: bool):
+            calls = (await warmup.stats())["calls"]
+            step_calls.append((name, fragment_only, calls - last[0]))
+            last[0] = calls
+
+        users[0].after_step = after_step
+    before = await warmup.stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(u.run_flow() for u in users))
+    wall = time.perf_counter() - start
+    after = await warmup.stats()
+    for u in users:
+        await u.close()
+    return {"users": users, "before": before, "after": after, "wall": wall,
+            "step_calls": step_calls}
+
+
+def run(sessions: int, latency_ms: float, jitter_ms: float, items: int, checkpoints: int,
+        seed: int, timeout: float, password: str | None = None,
+        precompute: bool = False, steps: bool = False) -> dict:
+    config = {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "items": items,
+              "checkpoints": checkpoints, "seed": seed, "precompute": precompute}
+    port = _free_port()
+    proc = _start_server(port, config, password)
+    try:
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        result = asyncio.run(_drive(url, sessions, seed, timeout, password, steps))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    users, before, after = result["users"], result["before"], result["after"]
+    reruns = [s for u in users for s in u.reruns]
+    first_runs = [u.first_run for u in users if u.first_run is not None]
+    logins = [u.login for u in users if u.login is not None]
+    calls = after["calls"] - before["calls"]
+    payload = after["payload_bytes"] - before["payload_bytes"]
+    rss_growth = (after["rss"] - before["rss"]) if after["rss"] and before["rss"] else 0
+    state_sizes = [after["state_sizes"][u.session_id] for u in users
+                   if u.session_id in after["state_sizes"]]
+    return {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "fragment_reruns": sum(u.fragment_reruns for u in users),
+        "wall_s": result["wall"],
+        "p50_ms": _percentile(reruns, 50) * 1000,
+        "p95_ms": _percentile(reruns, 95) * 1000,
+        "p99_ms": _percentile(reruns, 99) * 1000,
+        "first_run_p50_ms": _percentile(first_runs, 50) * 1000,
+        "first_run_p95_ms": _percentile(first_runs, 95) * 1000,
+        "login_p50_ms": _percentile(logins, 50) * 1000,
+        "backend_calls": calls,
+        "backend_calls_per_rerun": calls / max(len(reruns), 1),
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "skipped_fetches": after["skipped"] - before["skipped"],
+        "payload_kb_per_rerun": payload / max(len(reruns), 1) / 1024,
+        "rss_per_session_kb": rss_growth / max(sessions, 1) / 1024,
+        "state_per_session_kb": sum(state_sizes) / max(len(state_sizes), 1) / 1024,
+        "incomplete": sum(not u.completed for u in users),
+        "errors": [e for u in users for e in u.errors],
+        "step_calls": result["step_calls"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--items", type=int, default=30)
+    parser.add_argument("--checkpoints", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--password", help="Enable the login gate and log in each session")
+    parser.add_argument("--precompute", action="store_true",
+                        help="Run one worker.py pass first so views read precomputed results")
+    parser.add_argument("--steps", action="store_true",
+                        help="One session; print backend calls per interaction")
+    args = parser.parse_args()
+
+    if args.steps:
+        r = run(1, args.latency_ms, args.jitter_ms, args.items, args.checkpoints,
+                args.seed, args.timeout, args.password, args.precompute, steps=True)
+        print(f"{'step':<16} {'rerun':>8} {'calls':>5}")
+        for name, fragment_only, calls in r["step_calls"]:
+            print(f"{name:<16} {'fragment' if fragment_only else 'full':>8} {calls:>5}")
+        print(f"{'total':<16} {'':>8} {r['backend_calls']:>5}")
+        for err in r["errors"][:5]:
+            print(f"  error: {err}")
+        return
+
+    header = f"{'sessions':>8} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} " \
+             f"{'first ms':>8} {'calls/rerun':>11} {'KB/rerun':>8} " \
+             f"{'RSS KB/sess':>11} {'state KB':>8}"
+    print(header)
+    for n in args.sessions:
+        r = run(n, args.latency_ms, args.jitter_ms, args.items, args.checkpoints,
+                args.seed, args.timeout, args.password, args.precompute)
+        print(f"{r['sessions']:>8} {r['reruns']:>7} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['first_run_p50_ms']:>8.1f} "
+              f"{r['backend_calls_per_rerun']:>11.2f} {r['payload_kb_per_rerun']:>8.1f} "
+              f"{r['rss_per_session_kb']:>11.1f} "
+              f"{r['state_per_session_kb']:>8.1f}")
+        print(f"{'':>8} fragment reruns={r['fragment_reruns']} coalesced={r['coalesced']} "
+              f"skipped fetches={r['skipped_fetches']} wall={r['wall_s']:.1f}s "
+              f"first render p95={r['first_run_p95_ms']:.1f}ms login={r['login_p50_ms']:.1f}ms "
+              f"incomplete={r['incomplete']}")
+        for err in r["errors"][:5]:
+            print(f"  error: {err}")
+
+
+if __name__ == "__main__":
+    if runtime.exists():
+        _serve()
+    else:
+        main()
@@ -0,0 +1,278 @@
+"""
+In-memory stand-in for the Supabase table API used by db.py.
+
+Implements the subset of the supabase-py query builder that db.py calls
+(select / eq / neq / gt / lte / in_ / order / limit / insert / upsert /
+update / delete / execute) on plain Python lists, plus rpc("item_estimations")
+through its SQLite twin (estimation_sql.py), with configurable per-request
+latency. Used by the load-test harness in place of a real project.
+"""
+import copy
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse as parse_dt
+
+
+class _Response:
+    def __init__(self, data: list[dict]):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, backend: "LocalBackend", table: str):
+        self._backend = backend
+        self._table = table
+        self._op = "select"
+        self._columns: list[str] | None = None
+        self._payload = None
+        self._filters: list = []
+        self._order: tuple[str, bool] | None = None
+        self._limit: int | None = None
+        self._key = "id"
+
+    def select(self, columns: str = "*"):
+        self._op = "select"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id"):
+        self._op = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._key = on_conflict
+        return self
+
+    def update(self, values: dict):
+        self._op = "update"
+        self._payload = values
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def lte(self, column: str, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def in_(self, column: str, values):
+        allowed = set(values)
+        self._filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        return all(f(row) for f in self._filters)
+
+    def execute(self) -> _Response:
+        self._backend._delay()
+        with self._backend._lock:
+            self._backend.calls += 1
+            rows = self._backend.tables.setdefault(self._table, [])
+            if self._op == "insert":
+                new_rows = copy.deepcopy(self._payload)
+                rows.extend(new_rows)
+                self._backend._changed(self._table, new_rows)
+                return _Response(new_rows)
+            if self._op == "upsert":
+                new_rows = copy.deepcopy(self._payload)
+                key = self._key
+                by_id = {row[key]: row for row in new_rows}
+                rows[:] = [by_id.pop(row[key], row) for row in rows]
+                rows.extend(by_id.values())
+                self._backend._changed(self._table, new_rows)
+                return _Response(new_rows)
+            if self._op == "update":
+                hit = [row for row in rows if self._matches(row)]
+                for row in hit:
+                    row.update(self._payload)
+                self._backend._changed(self._table, hit)
+                return _Response(copy.deepcopy(hit))
+            if self._op == "delete":
+                hit = [row for row in rows if self._matches(row)]
+                self._backend.tables[self._table] = [row for row in rows if not self._matches(row)]
+                self._backend._changed(self._table, hit, deleted=True)
+                if self._table == "items":
+                    gone = {row["id"] for row in hit}
+                    cps = self._backend.tables.get("checkpoints", [])
+                    self._backend._changed(
+                        "checkpoints", [cp for cp in cps if cp["item_id"] in gone], deleted=True
+                    )
+                    self._backend.tables["checkpoints"] = [
+                        cp for cp in cps if cp["item_id"] not in gone
+                    ]
+                    self._backend.tables["item_precomputed"] = [
+                        p for p in self._backend.tables.get("item_precomputed", [])
+                        if p["item_id"] not in gone
+                    ]
+                return _Response(hit)
+
+            hit = [row for row in rows if self._matches(row)]
+            if self._order:
+                column, desc = self._order
+                hit.sort(key=lambda row: row.get(column) or "", reverse=desc)
+            if self._limit is not None:
+                hit = hit[:self._limit]
+            if self._columns:
+                hit = [{c: row.get(c) for c in self._columns} for row in hit]
+            return _Response(copy.deepcopy(hit))
+
+
+class _Rpc:
+    def __init__(self, backend: "LocalBackend", name: str, params: dict):
+        if name != "item_estimations":
+            raise ValueError(f"Unknown function: {name}")
+        self._backend = backend
+        self._params = params
+
+    def execute(self) -> _Response:
+        from db import PRECOMPUTED_MAX_AGE_SECONDS
+        from estimation_sql import sqlite_item_estimations
+
+        self._backend._delay()
+        with self._backend._lock:
+            self._backend.calls += 1
+            data = {
+                name: list(self._backend.tables.get(name, []))
+                for name in ("items", "checkpoints", "data_revisions", "item_precomputed")
+            }
+        now = self._params.get("p_now")
+        return _Response(sqlite_item_estimations(
+            data,
+            self._params.get("p_status"),
+            self._params.get("p_item_types"),
+            parse_dt(now) if now else None,
+            self._params.get("p_max_age_seconds", PRECOMPUTED_MAX_AGE_SECONDS),
+        ))
+
+
+class LocalBackend:
+    """Thread-safe in-memory tables with simulated request latency."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables: dict[str, list[dict]] = {"items": [], "checkpoints": []}
+        self.calls = 0
+        self._journal_seq = 0
+        self._revision_seq = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _delay(self):
+        if self.latency_ms <= 0 and self.jitter_ms <= 0:
+            return
+        with self._lock:
+            ms = self._rng.gauss(self.latency_ms, self.jitter_ms)
+        time.sleep(max(ms, 0.0) / 1000)
+
+    def _changed(self, table: str, rows: list[dict], deleted: bool = False):
+        """Run the per-row triggers of items and checkpoints for a write."""
+        if table in ("items", "checkpoints") and rows:
+            self._bump_revisions(table, rows, deleted)
+            self._journal(table, rows, deleted)
+
+    def _journal(self, table: str, rows: list[dict], deleted: bool):
+        """Mirror the journal triggers (migrations/006_journal_trigger.sql)."""
+        ts = datetime.now(timezone.utc).isoformat()
+        op = ("delete_" if deleted else "upsert_") + table.removesuffix("s")
+        journal = self.tables.setdefault("journal", [])
+        for row in rows:
+            self._journal_seq += 1
+            if deleted:
+                args = {"id": row["id"]}
+            else:
+                args = {k: copy.deepcopy(v) for k, v in row.items() if v is not None}
+            journal.append({"seq": self._journal_seq, "ts": ts, "op": op, "args": args})
+
+    def _bump_revisions(self, table: str, rows: list[dict], deleted: bool):
+        """Mirror the data_revisions trigger (migrations/007_data_revisions_cleanup.sql)."""
+        revisions = {r["scope"]: r for r in self.tables.setdefault("data_revisions", [])}
+        live = {item["id"] for item in self.tables.get("items", [])}
+        item_key = "id" if table == "items" else "item_id"
+        for row in rows:
+            self._revision_seq += 1
+            scopes = [table]
+            item_scope = f"item:{row[item_key]}"
+            if deleted and (table == "items" or row[item_key] not in live):
+                revisions.pop(item_scope, None)
+            else:
+                scopes.append(item_scope)
+            for scope in scopes:
+                if scope not in revisions:
+                    revisions[scope] = {"scope": scope, "revision": 0}
+                current = revisions[scope]
+                current["revision"] = max(current["revision"] + 1, self._revision_seq)
+        self.tables["data_revisions"] = list(revisions.values())
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict | None = None) -> _Rpc:
+        return _Rpc(self, name, params or {})
+
+    def seed(self, n_items: int, n_checkpoints: int, seed: int = 0):
+        """Fill the tables with n_items items of n_checkpoints checkpoints each."""
+        from db import ITEM_TYPES, STATUSES, UNIT_TYPES
+
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        for i in range(n_items):
+            item_id = str(uuid.uuid4())
+            total = float(rng.randint(100, 1000))
+            start = now - timedelta(days=rng.randint(5, 120))
+            self.tables["items"].append({
+                "id": item_id,
+                "name": f"Item {i}",
+                "item_type": rng.choice(ITEM_TYPES),
+                "unit_type": rng.choice(UNIT_TYPES),
+                "total_units": total,
+                "status": STATUSES[0] if i % 4 else rng.choice(STATUSES),
+                "created_at": start.isoformat(),
+            })
+            units = 0.0
+            span = (now - start) / max(n_checkpoints, 1)
+            for j in range(n_checkpoints):
+                self.tables["checkpoints"].append({
+                    "id": str(uuid.uuid4()),
+                    "item_id": item_id,
+                    "units_completed": units,
+                    "timestamp": (start + span * j).isoformat(),
+                    "notes": f"note {j}" if j % 3 == 0 else None,
+                    "status": "completed",
+                })
+                units = min(units + rng.uniform(0, total / n_checkpoints * 1.5), total)
+        # As after migration 007's backfill: every live item has a revision row
+        revisions = self.tables.setdefault("data_revisions", [])
+        known = {r["scope"] for r in revisions}
+        for scope in ["items", "checkpoints"] + [f"item:{i['id']}" for i in self.tables["items"]]:
+            if scope not in known:
+                self._revision_seq += 1
+                revisions.append({"scope": scope, "revision": self._revision_seq})
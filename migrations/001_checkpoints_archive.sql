@@ -0,0 +1,14 @@
+-- Archive for checkpoints removed by compaction (compaction.py).
+-- Same columns as checkpoints, plus the rollup row they were folded into.
+create table if not exists checkpoints_archive (
+    id text primary key,
+    item_id text not null,
+    units_completed real not null,
+    "timestamp" text not null,
+    notes text,
+    status text not null default 'completed',
+    rolled_into text,
+    archived_at text not null
+);
+
+create index if not exists idx_checkpoints_archive_item on checkpoints_archive(item_id);
@@ -0,0 +1,38 @@
+-- Change-detection stamps for db.py's revision probe.
+-- One row per scope: 'items', 'checkpoints' and 'item:<id>' (bumped by any
+-- write to that item or its checkpoints). Revisions only ever increase.
+create table if not exists data_revisions (
+    scope text primary key,
+    revision bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function bump_data_revision() returns trigger
+language plpgsql as $$
+declare
+    row_item text;
+begin
+    if TG_TABLE_NAME = 'items' then
+        row_item := case when TG_OP = 'DELETE' then OLD.id else NEW.id end;
+    else
+        row_item := case when TG_OP = 'DELETE' then OLD.item_id else NEW.item_id end;
+    end if;
+
+    insert into data_revisions (scope, revision)
+    values (TG_TABLE_NAME, 1), ('item:' || row_item, 1)
+    on conflict (scope) do update
+        set revision = data_revisions.revision + 1,
+            updated_at = now();
+    return null;
+end;
+$$;
+
+drop trigger if exists items_bump_revision on items;
+create trigger items_bump_revision
+    after insert or update or delete on items
+    for each row execute function bump_data_revision();
+
+drop trigger if exists checkpoints_bump_revision on checkpoints;
+create trigger checkpoints_bump_revision
+    after insert or update or delete on checkpoints
+    for each row execute function bump_data_revision();
@@ -0,0 +1,11 @@
+-- Append-only operation journal, filled by the triggers in
+-- migrations/006_journal_trigger.sql.
+-- journal.py exports it incrementally and replays it for point-in-time restore.
+create table if not exists journal (
+    seq bigint generated always as identity primary key,
+    ts text not null,
+    op text not null,
+    args jsonb not null
+);
+
+create index if not exists idx_journal_ts on journal(ts);
@@ -0,0 +1,87 @@
+-- Grid rows for the list view in one call: db.get_item_estimations().
+-- Same arithmetic as compute_estimation() in estimation.py, evaluated at
+-- p_now; cp_timestamps / cp_units are the completed checkpoint series used
+-- for the Monte Carlo ETA range. The SQLite twin and parity checks live in
+-- estimation_sql.py (python cli.py check-estimations).
+create or replace function item_estimations(
+    p_status text default null,
+    p_item_types text[] default null,
+    p_now timestamptz default now()
+)
+returns table (
+    id text,
+    name text,
+    item_type text,
+    unit_type text,
+    total_units double precision,
+    status text,
+    created_at text,
+    "current" double precision,
+    percent double precision,
+    remaining double precision,
+    speed double precision,
+    hours_remaining double precision,
+    eta timestamptz,
+    cp_timestamps text[],
+    cp_units double precision[]
+)
+language sql stable as $$
+    with filtered as (
+        select * from items i
+        where (p_status is null or i.status = p_status)
+          and (p_item_types is null or i.item_type = any(p_item_types))
+    ),
+    completed as (
+        select
+            c.item_id,
+            c.units_completed::double precision as units,
+            row_number() over w as rn,
+            count(*) over w_all as n,
+            (first_value(c."timestamp") over w_all)::timestamptz as t0,
+            array_agg(c."timestamp") over w_all as cp_timestamps,
+            array_agg(c.units_completed::double precision) over w_all as cp_units
+        from checkpoints c
+        where c.status = 'completed'
+          and c.item_id in (select f.id from filtered f)
+        window w as (partition by c.item_id order by c."timestamp"),
+               w_all as (w rows between unbounded preceding and unbounded following)
+    ),
+    est as (
+        select
+            f.*,
+            coalesce(l.units, 0) as cur,
+            coalesce(l.n, 0) as n,
+            extract(epoch from p_now - l.t0)::double precision / 3600.0 as elapsed_hours,
+            coalesce(l.cp_timestamps, '{}') as cp_ts,
+            coalesce(l.cp_units, '{}') as cp_u
+        from filtered f
+        left join completed l on l.item_id = f.id and l.rn = l.n
+    ),
+    spd as (
+        select
+            est.*,
+            case when est.n >= 2 then greatest(
+                case when est.elapsed_hours > 0 then est.cur / est.elapsed_hours else 0.001 end,
+                0.001
+            ) end as spd
+        from est
+    )
+    select
+        s.id,
+        s.name,
+        s.item_type,
+        s.unit_type,
+        s.total_units::double precision,
+        s.status,
+        s.created_at,
+        s.cur,
+        case when s.total_units > 0 then s.cur / s.total_units * 100 else 0 end,
+        s.total_units - s.cur,
+        s.spd,
+        (s.total_units - s.cur) / s.spd,
+        p_now + make_interval(secs => (s.total_units - s.cur) / s.spd * 3600),
+        s.cp_ts,
+        s.cp_u
+    from spd s
+    order by s.created_at desc;
+$$;
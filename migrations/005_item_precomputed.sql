@@ -0,0 +1,110 @@
+-- Per-item results precomputed by worker.py: the compute_estimation() and
+-- compute_eta_quantiles() dicts (datetimes as ISO strings) and the progress
+-- chart as Plotly JSON, tagged with the data_revisions revision of
+-- 'item:<id>' they were computed at. Derived data: not journaled and safe
+-- to truncate.
+create table if not exists item_precomputed (
+    item_id text primary key references items(id) on delete cascade,
+    revision bigint not null,
+    computed_at timestamptz not null default now(),
+    estimation jsonb not null,
+    eta_quantiles jsonb,
+    chart jsonb
+);
+
+-- item_estimations() (migrations/004) additionally returns the worker's ETA
+-- quantiles when they were computed at the item's current revision within
+-- p_max_age_seconds; otherwise eta_quantiles is null and the app runs the
+-- Monte Carlo itself. The return type changes, so drop and recreate.
+drop function if exists item_estimations(text, text[], timestamptz);
+
+create or replace function item_estimations(
+    p_status text default null,
+    p_item_types text[] default null,
+    p_now timestamptz default now(),
+    p_max_age_seconds double precision default 900
+)
+returns table (
+    id text,
+    name text,
+    item_type text,
+    unit_type text,
+    total_units double precision,
+    status text,
+    created_at text,
+    "current" double precision,
+    percent double precision,
+    remaining double precision,
+    speed double precision,
+    hours_remaining double precision,
+    eta timestamptz,
+    cp_timestamps text[],
+    cp_units double precision[],
+    eta_quantiles jsonb
+)
+language sql stable as $$
+    with filtered as (
+        select * from items i
+        where (p_status is null or i.status = p_status)
+          and (p_item_types is null or i.item_type = any(p_item_types))
+    ),
+    completed as (
+        select
+            c.item_id,
+            c.units_completed::double precision as units,
+            row_number() over w as rn,
+            count(*) over w_all as n,
+            (first_value(c."timestamp") over w_all)::timestamptz as t0,
+            array_agg(c."timestamp") over w_all as cp_timestamps,
+            array_agg(c.units_completed::double precision) over w_all as cp_units
+        from checkpoints c
+        where c.status = 'completed'
+          and c.item_id in (select f.id from filtered f)
+        window w as (partition by c.item_id order by c."timestamp"),
+               w_all as (w rows between unbounded preceding and unbounded following)
+    ),
+    est as (
+        select
+            f.*,
+            coalesce(l.units, 0) as cur,
+            coalesce(l.n, 0) as n,
+            extract(epoch from p_now - l.t0)::double precision / 3600.0 as elapsed_hours,
+            coalesce(l.cp_timestamps, '{}') as cp_ts,
+            coalesce(l.cp_units, '{}') as cp_u
+        from filtered f
+        left join completed l on l.item_id = f.id and l.rn = l.n
+    ),
+    spd as (
+        select
+            est.*,
+            case when est.n >= 2 then greatest(
+                case when est.elapsed_hours > 0 then est.cur / est.elapsed_hours else 0.001 end,
+                0.001
+            ) end as spd
+        from est
+    )
+    select
+        s.id,
+        s.name,
+        s.item_type,
+        s.unit_type,
+        s.total_units::double precision,
+        s.status,
+        s.created_at,
+        s.cur,
+        case when s.total_units > 0 then s.cur / s.total_units * 100 else 0 end,
+        s.total_units - s.cur,
+        s.spd,
+        (s.total_units - s.cur) / s.spd,
+        p_now + make_interval(secs => (s.total_units - s.cur) / s.spd * 3600),
+        s.cp_ts,
+        s.cp_u,
+        p.eta_quantiles
+    from spd s
+    left join data_revisions r on r.scope = 'item:' || s.id
+    left join item_precomputed p
+        on p.item_id = s.id
+       and p.revision = coalesce(r.revision, 0)
+       and p.computed_at >= p_now - make_interval(secs => p_max_age_seconds)
+    order by s.created_at desc;
+$$;
@@ -0,0 +1,33 @@
+-- Journal rows from triggers instead of client-side inserts, so an entry is
+-- written in the same transaction as the change it records (no extra round
+-- trip, nothing lost if the client dies between the two requests).
+-- Entries are row images: upsert_item / upsert_checkpoint carry the full new
+-- row, delete_item / delete_checkpoint the id. Cascaded checkpoint deletes
+-- fire the trigger too. ts is the transaction start time as ISO 8601.
+alter table journal alter column ts set default (to_jsonb(now()) #>> '{}');
+
+create or replace function journal_row_change() returns trigger
+language plpgsql as $$
+declare
+    kind text := case when TG_TABLE_NAME = 'items' then 'item' else 'checkpoint' end;
+begin
+    if TG_OP = 'DELETE' then
+        insert into journal (op, args)
+        values ('delete_' || kind, jsonb_build_object('id', OLD.id));
+    else
+        insert into journal (op, args)
+        values ('upsert_' || kind, jsonb_strip_nulls(to_jsonb(NEW)));
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists items_journal on items;
+create trigger items_journal
+    after insert or update or delete on items
+    for each row execute function journal_row_change();
+
+drop trigger if exists checkpoints_journal on checkpoints;
+create trigger checkpoints_journal
+    after insert or update or delete on checkpoints
+    for each row execute function journal_row_change();
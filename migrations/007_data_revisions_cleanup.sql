@@ -0,0 +1,55 @@
+-- Keep data_revisions to one row per live item, and make a missing row mean
+-- "unknown" rather than "revision 0" (db.py's probe reads those in full).
+-- Revisions are now drawn from one sequence, so an item that is deleted and
+-- later restored with the same id never repeats a revision a reader cached.
+-- greatest(revision + 1, ...) keeps them increasing when two writers race.
+-- Deleting an item deletes its 'item:<id>' row; cascaded checkpoint deletes
+-- only bump 'checkpoints'.
+create sequence if not exists data_revision_seq;
+select setval('data_revision_seq',
+              greatest((select coalesce(max(revision), 0) from data_revisions), 1));
+
+-- Items untouched since 002 never got a row: give them one.
+insert into data_revisions (scope, revision)
+select scope, nextval('data_revision_seq')
+from (select 'items' as scope
+      union all select 'checkpoints'
+      union all select 'item:' || id from items) s
+on conflict (scope) do nothing;
+
+-- Rows left behind by items deleted before this migration.
+delete from data_revisions r
+where r.scope like 'item:%'
+  and not exists (select 1 from items i where 'item:' || i.id = r.scope);
+
+create or replace function bump_data_revision() returns trigger
+language plpgsql as $$
+declare
+    row_item text;
+    rev bigint := nextval('data_revision_seq');
+begin
+    if TG_TABLE_NAME = 'items' then
+        row_item := case when TG_OP = 'DELETE' then OLD.id else NEW.id end;
+    else
+        row_item := case when TG_OP = 'DELETE' then OLD.item_id else NEW.item_id end;
+    end if;
+
+    insert into data_revisions (scope, revision)
+    values (TG_TABLE_NAME, rev)
+    on conflict (scope) do update
+        set revision = greatest(data_revisions.revision + 1, excluded.revision),
+            updated_at = now();
+
+    if TG_OP = 'DELETE'
+       and (TG_TABLE_NAME = 'items' or not exists (select 1 from items where id = row_item)) then
+        delete from data_revisions where scope = 'item:' || row_item;
+    else
+        insert into data_revisions (scope, revision)
+        values ('item:' || row_item, rev)
+        on conflict (scope) do update
+            set revision = greatest(data_revisions.revision + 1, excluded.revision),
+                updated_at = now();
+    end if;
+    return null;
+end;
+$$;
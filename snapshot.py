@@ -0,0 +1,300 @@
+"""
+Columnar binary snapshots of items and checkpoints (Arrow IPC, zstd).
+
+A snapshot file is a small header followed by two Arrow IPC files, one per
+table:
+
+    b"LTSNAP1\\n" | uint64 LE length of items | items | zero padding | checkpoints
+
+The padding aligns the checkpoints file to 64 bytes and is not counted in the
+header length, so the items file is sliced exactly.
+
+Low-cardinality strings (item_id, unit_type, item_type, status) are
+dictionary-encoded, timestamps are typed UTC microsecond columns and numbers
+are float64, with an *_is_int column marking the values that were integers
+(so 100 comes back as 100, not 100.0). Timestamp strings that don't survive a
+parse/format round trip exactly (e.g. "Z" suffix, legacy empty strings) are
+kept verbatim in a sparse *_raw column, so JSON -> snapshot -> JSON is
+lossless. Rows with columns outside the schema are rejected rather than
+silently dropped.
+
+Files are opened memory-mapped, so they can be inspected or filtered one
+record batch at a time without loading everything into memory. They are
+written the same way: dictionaries only grow and are emitted as deltas, so
+checkpoints are encoded one record batch at a time as they are read.
+"""
+import io
+import struct
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+MAGIC = b"LTSNAP1\n"
+_HEADER = struct.Struct("<Q")
+_ALIGN = 64
+BATCH_ROWS = 64 * 1024
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+_TS = pa.timestamp("us", tz="UTC")
+
+ITEMS_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("name", pa.string()),
+    ("item_type", _DICT),
+    ("unit_type", _DICT),
+    ("total_units", pa.float64()),
+    ("total_units_is_int", pa.bool_()),
+    ("status", _DICT),
+    ("created_at", _TS),
+    ("created_at_raw", pa.string()),
+])
+
+CHECKPOINTS_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("item_id", _DICT),
+    ("units_completed", pa.float64()),
+    ("units_completed_is_int", pa.bool_()),
+    ("timestamp", _TS),
+    ("timestamp_raw", pa.string()),
+    ("notes", pa.string()),
+    ("status", _DICT),
+])
+
+_TS_COLUMNS = {"items": "created_at", "checkpoints": "timestamp"}
+_NUMBER_COLUMNS = {"items": "total_units", "checkpoints": "units_completed"}
+_DEFAULTS = {"items": {"status": "active"}, "checkpoints": {"status": "completed"}}
+
+
+class Snapshot(NamedTuple):
+    """Memory-mapped readers for the two tables of a snapshot."""
+    items: pa.ipc.RecordBatchFileReader
+    checkpoints: pa.ipc.RecordBatchFileReader
+
+
+# ---- Encoding ----
+
+
+def _parse_ts(value: str | None) -> tuple[datetime | None, str | None]:
+    """Return (typed timestamp, raw string if the typed value isn't exact)."""
+    if value is None:
+        return None, None
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, value
+    if dt.tzinfo is None:
+        return None, value
+    dt = dt.astimezone(timezone.utc)
+    return dt, None if dt.isoformat() == value else value
+
+
+def _to_batch(
+    rows: list[dict], schema: pa.Schema, table: str, dictionaries: dict[str, dict]
+) -> pa.RecordBatch:
+    """
+    One record batch. Dictionary columns index into dictionaries, which only
+    grow from batch to batch, so the IPC writer emits them as deltas (the file
+    format can't replace a dictionary). Raises ValueError if a row has a
+    column the schema can't hold.
+    """
+    ts_col = _TS_COLUMNS[table]
+    num_col = _NUMBER_COLUMNS[table]
+    defaults = _DEFAULTS[table]
+    derived = {f"{ts_col}_raw", f"{num_col}_is_int"}
+    unexpected = set().union(*rows) - (set(schema.names) - derived)
+    if unexpected:
+        raise ValueError(f"Unexpected {table} columns: {', '.join(sorted(map(str, unexpected)))}")
+    parsed = [_parse_ts(row.get(ts_col)) for row in rows]
+    columns = []
+    for field in schema:
+        if field.name == ts_col:
+            values = [p[0] for p in parsed]
+        elif field.name == f"{ts_col}_raw":
+            values = [p[1] for p in parsed]
+        elif field.name == f"{num_col}_is_int":
+            values = [type(row.get(num_col)) is int for row in rows]
+        else:
+            values = [row.get(field.name, defaults.get(field.name)) for row in rows]
+        if pa.types.is_dictionary(field.type):
+            codes = dictionaries.setdefault(field.name, {})
+            indices = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+            columns.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, pa.int32()), pa.array(list(codes), pa.string())
+            ))
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.record_batch(columns, schema=schema)
+
+
+def _batches(
+    pages: Iterable[list[dict]], schema: pa.Schema, table: str
+) -> Iterator[pa.RecordBatch]:
+    """Record batches of BATCH_ROWS rows from pages of any size."""
+    dictionaries: dict[str, dict] = {}
+    rows: list[dict] = []
+    for page in pages:
+        rows.extend(page)
+        while len(rows) >= BATCH_ROWS:
+            yield _to_batch(rows[:BATCH_ROWS], schema, table, dictionaries)
+            rows = rows[BATCH_ROWS:]
+    if rows:
+        yield _to_batch(rows, schema, table, dictionaries)
+
+
+def _write_ipc(sink, batches: Iterable[pa.RecordBatch], schema: pa.Schema):
+    options = pa.ipc.IpcWriteOptions(compression="zstd", emit_dictionary_deltas=True)
+    with pa.ipc.new_file(sink, schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _padding(offset: int) -> int:
+    return -offset % _ALIGN
+
+
+def write_snapshot_pages(
+    out: BinaryIO, items: Iterable[list[dict]], checkpoints: Iterable[list[dict]]
+):
+    """
+    Write a snapshot from pages of rows. The items file is built in memory,
+    since the header carries its length; checkpoints are encoded and written
+    one record batch at a time, so out needn't be seekable (e.g. stdout).
+    """
+    sink = pa.BufferOutputStream()
+    _write_ipc(sink, _batches(items, ITEMS_SCHEMA, "items"), ITEMS_SCHEMA)
+    items_file = sink.getvalue()
+    out.write(MAGIC)
+    out.write(_HEADER.pack(items_file.size))
+    out.write(items_file)
+    out.write(b"\0" * _padding(len(MAGIC) + _HEADER.size + items_file.size))
+    _write_ipc(
+        out, _batches(checkpoints, CHECKPOINTS_SCHEMA, "checkpoints"), CHECKPOINTS_SCHEMA
+    )
+
+
+def snapshot_bytes(data: dict) -> bytes:
+    """Encode {"items": [...], "checkpoints": [...]} as a snapshot."""
+    out = io.BytesIO()
+    write_snapshot_pages(out, [data.get("items", [])], [data.get("checkpoints", [])])
+    return out.getvalue()
+
+
+def write_snapshot(data: dict, path: str):
+    with open(path, "wb") as f:
+        write_snapshot_pages(f, [data.get("items", [])], [data.get("checkpoints", [])])
+
+
+# ---- Decoding ----
+
+
+def is_snapshot(blob: bytes) -> bool:
+    return blob[:len(MAGIC)] == MAGIC
+
+
+def open_snapshot(source: str | bytes) -> Snapshot:
+    """Open a snapshot from a path (memory-mapped) or from bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        buf = pa.py_buffer(source)
+    else:
+        buf = pa.memory_map(source, "r").read_buffer()
+    if buf.size < len(MAGIC) + _HEADER.size or buf.slice(0, len(MAGIC)).to_pybytes() != MAGIC:
+        raise ValueError("Not a learning-tracker snapshot")
+    start = len(MAGIC) + _HEADER.size
+    (items_len,) = _HEADER.unpack(buf.slice(len(MAGIC), _HEADER.size).to_pybytes())
+    end = start + items_len
+    return Snapshot(
+        items=pa.ipc.open_file(buf.slice(start, items_len)),
+        checkpoints=pa.ipc.open_file(buf.slice(end + _padding(end))),
+    )
+
+
+def _iter_batches(reader: pa.ipc.RecordBatchFileReader) -> Iterator[pa.RecordBatch]:
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i)
+
+
+def _to_rows(batch: pa.RecordBatch | pa.Table, table: str) -> list[dict]:
+    ts_col = _TS_COLUMNS[table]
+    num_col = _NUMBER_COLUMNS[table]
+    rows = batch.to_pylist()
+    for row in rows:
+        # Snapshots written before the flag existed read back as floats
+        if row.pop(f"{num_col}_is_int", False):
+            row[num_col] = int(row[num_col])
+        raw = row.pop(f"{ts_col}_raw")
+        if raw is not None:
+            row[ts_col] = raw
+        elif row[ts_col] is not None:
+            row[ts_col] = row[ts_col].astimezone(timezone.utc).isoformat()
+    return rows
+
+
+def iter_rows(reader: pa.ipc.RecordBatchFileReader, table: str, mask=None) -> Iterator[list[dict]]:
+    """
+    Yield rows batch by batch. mask, if given, is called with each record
+    batch and returns a boolean array selecting rows to keep.
+    """
+    for batch in _iter_batches(reader):
+        if mask is not None:
+            batch = batch.filter(mask(batch))
+        if batch.num_rows:
+            yield _to_rows(batch, table)
+
+
+def read_snapshot(source: str | bytes) -> dict:
+    """Decode a snapshot back into the JSON export structure."""
+    return filter_snapshot(source)
+
+
+def filter_snapshot(
+    source: str | bytes,
+    item_ids: list[str] | None = None,
+    status: str | None = None,
+) -> dict:
+    """
+    Read a subset of a snapshot: items with the given ids and/or status, and
+    their checkpoints. Filtering is done per record batch on the mapped file.
+    """
+    snap = open_snapshot(source)
+
+    def item_mask(batch):
+        keep = pa.array([True] * batch.num_rows)
+        if item_ids is not None:
+            keep = pc.and_(keep, pc.is_in(batch.column("id"), value_set=pa.array(item_ids)))
+        if status is not None:
+            keep = pc.and_(keep, pc.equal(batch.column("status").cast(pa.string()), status))
+        return keep
+
+    filtering = item_ids is not None or status is not None
+    items = [row for rows in iter_rows(snap.items, "items", item_mask if filtering else None)
+             for row in rows]
+
+    kept = pa.array([item["id"] for item in items], pa.string())
+
+    def cp_mask(batch):
+        return pc.is_in(batch.column("item_id").cast(pa.string()), value_set=kept)
+
+    checkpoints = [
+        row
+        for rows in iter_rows(snap.checkpoints, "checkpoints", cp_mask if filtering else None)
+        for row in rows
+    ]
+    return {"items": items, "checkpoints": checkpoints}
+
+
+def summarize(source: str | bytes) -> dict:
+    """Row counts and per-status item counts without decoding rows."""
+    snap = open_snapshot(source)
+    by_status: dict[str, int] = {}
+    items = 0
+    for batch in _iter_batches(snap.items):
+        items += batch.num_rows
+        counts = pc.value_counts(batch.column("status").cast(pa.string()))
+        for entry in counts.to_pylist():
+            by_status[entry["values"]] = by_status.get(entry["values"], 0) + entry["counts"]
+    checkpoints = sum(
+        snap.checkpoints.get_batch(i).num_rows for i in range(snap.checkpoints.num_record_batches)
+    )
+    return {"items": items, "checkpoints": checkpoints, "items_by_status": by_status}
@@ -0,0 +1,148 @@
+"""
+Namespaced per-entity UI state with garbage collection.
+
+Per-item and per-checkpoint keys (edit toggles, widget keys) are built with
+ui_key(kind, entity_id, field), which yields "ui:<kind>:<id>:<field>" and
+records that the entity was shown in the current run. collect(), called at
+the end of every full run, drops the state of entities that haven't been on
+screen for KEEP_RUNS runs and enforces a per-session memory budget by
+evicting the least recently shown entities first. The measured sizes are
+kept for session_report() and summarized on stderr every REPORT_LOG_SECONDS.
+"""
+import os
+import pickle
+import sys
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+PREFIX = "ui"
+KEEP_RUNS = 3
+DEFAULT_BUDGET_KB = 512
+REPORT_TTL_SECONDS = 3600
+REPORT_LOG_SECONDS = 300
+
+_RUN_KEY = "_ui_run"
+_SEEN_KEY = "_ui_seen"
+
+_report_lock = threading.Lock()
+_session_sizes: dict[str, tuple[int, float]] = {}
+_last_log = 0.0
+
+
+def _get_budget_bytes() -> int:
+    """Read the per-session budget (KB) from st.secrets or environment variable."""
+    try:
+        value = st.secrets["SESSION_STATE_BUDGET_KB"]
+    except (KeyError, FileNotFoundError):
+        value = os.environ.get("SESSION_STATE_BUDGET_KB", DEFAULT_BUDGET_KB)
+    return int(value) * 1024
+
+
+def ui_key(kind: str, entity_id: str, field: str) -> str:
+    """Session-state key for one field of one entity's UI state."""
+    seen = st.session_state.setdefault(_SEEN_KEY, {})
+    seen[f"{kind}:{entity_id}"] = st.session_state.get(_RUN_KEY, 0)
+    return f"{PREFIX}:{kind}:{entity_id}:{field}"
+
+
+def _drop(entities: list[str]):
+    if not entities:
+        return
+    prefixes = tuple(f"{PREFIX}:{entity}:" for entity in entities)
+    for key in list(st.session_state.keys()):
+        if isinstance(key, str) and key.startswith(prefixes):
+            del st.session_state[key]
+    seen = st.session_state.get(_SEEN_KEY, {})
+    for entity in entities:
+        seen.pop(entity, None)
+
+
+def forget(kind: str, entity_id: str):
+    """Drop all UI state for an entity right away (e.g. after deleting it)."""
+    _drop([f"{kind}:{entity_id}"])
+
+
+def _sizeof(value) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _key_sizes(state: dict) -> dict:
+    return {k: _sizeof(k) + _sizeof(v) for k, v in state.items()}
+
+
+def session_size(state: dict | None = None) -> int:
+    """Approximate size in bytes of this session's state (or of the given state)."""
+    if state is None:
+        state = st.session_state.to_dict()
+    return sum(_key_sizes(state).values())
+
+
+def collect() -> int:
+    """
+    Garbage-collect entity state at the end of a full run and enforce the
+    memory budget. Entities shown in the current run are never evicted.
+    Returns the session size in bytes after collection.
+    """
+    run = st.session_state.get(_RUN_KEY, 0)
+    seen: dict[str, int] = st.session_state.setdefault(_SEEN_KEY, {})
+    _drop([entity for entity, last in seen.items() if run - last >= KEEP_RUNS])
+
+    # Pickling the whole state is the expensive part: measure each key once,
+    # subtract evicted entities' own keys, and measure again only at the end
+    key_sizes = _key_sizes(st.session_state.to_dict())
+    size = sum(key_sizes.values())
+    budget = _get_budget_bytes()
+    if size > budget:
+        entity_sizes: dict[str, int] = {}
+        for key, key_size in key_sizes.items():
+            if isinstance(key, str) and key.startswith(f"{PREFIX}:"):
+                kind, entity_id, _ = key[len(PREFIX) + 1:].split(":", 2)
+                entity = f"{kind}:{entity_id}"
+                entity_sizes[entity] = entity_sizes.get(entity, 0) + key_size
+        evicted = []
+        for entity in sorted((e for e, last in seen.items() if last < run), key=seen.get):
+            evicted.append(entity)
+            size -= entity_sizes.get(entity, 0)
+            if size <= budget:
+                break
+        _drop(evicted)
+        size = session_size()
+
+    st.session_state[_RUN_KEY] = run + 1
+    _record(size)
+    return size
+
+
+def _record(size: int):
+    """Store this session's size; log a summary of all sessions every REPORT_LOG_SECONDS."""
+    global _last_log
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    now = time.time()
+    with _report_lock:
+        _session_sizes[ctx.session_id] = (size, now)
+        for session_id, (_, updated) in list(_session_sizes.items()):
+            if now - updated > REPORT_TTL_SECONDS:
+                del _session_sizes[session_id]
+        if now - _last_log < REPORT_LOG_SECONDS:
+            return
+        _last_log = now
+        sizes = [s for s, _ in _session_sizes.values()]
+    print(
+        f"session state: sessions={len(sizes)} total_kb={sum(sizes) / 1024:.0f} "
+        f"max_kb={max(sizes) / 1024:.0f} budget_kb={_get_budget_bytes() // 1024}",
+        file=sys.stderr,
+    )
+
+
+def session_report() -> dict[str, int]:
+    """Last measured state size in bytes of every recently active session."""
+    with _report_lock:
+        return {session_id: size for session_id, (size, _) in _session_sizes.items()}
@@ -0,0 +1,183 @@
+"""
+Background precomputation worker.
+
+Keeps item_precomputed (migrations/005_item_precomputed.sql) up to date so
+the app reads estimations, ETA quantiles and progress charts instead of
+computing them inside a rerun:
+
+- Changes: polls data_revisions every POLL_SECONDS (paged by scope) and
+  recomputes every owned item whose 'item:<id>' revision moved since it was
+  last computed.
+- Schedule: every REFRESH_SECONDS all owned active items are recomputed, so
+  clock-dependent values (speed, ETA) never get older than
+  PRECOMPUTED_MAX_AGE_SECONDS, after which the app ignores them.
+- Sharding: an item belongs to shard crc32(item_id) % shards, so N workers
+  started with --shard 0..N-1 --shards N split the items without
+  coordinating.
+
+Run:
+    python worker.py                        # one worker owning every item
+    python worker.py --shard 0 --shards 4   # one of four
+    python worker.py --once                 # one scheduled pass, then exit (cron)
+"""
+import argparse
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+from charts import build_progress_chart, chart_to_json
+from db import (
+    FULL_COLUMNS,
+    PRECOMPUTED_MAX_AGE_SECONDS,
+    get_all_checkpoints_for_items,
+    get_items,
+    get_precomputed_revisions,
+    get_revisions,
+    save_precomputed,
+)
+from estimation import compute_estimation, compute_eta_quantiles_many, encode_estimation
+
+POLL_SECONDS = 2.0
+REFRESH_SECONDS = PRECOMPUTED_MAX_AGE_SECONDS / 3
+BATCH_SIZE = 100
+CHART_NOTE_ROWS = 50  # app.CHECKPOINT_PAGE_SIZE: the chart labels the rows the table shows
+
+
+def owns(item_id: str, shard: int, shards: int) -> bool:
+    """Stable shard assignment (crc32, unlike hash(), is the same in every process)."""
+    return zlib.crc32(item_id.encode()) % shards == shard
+
+
+def precompute_row(
+    item: dict, checkpoints: list[dict], revision: int, quantiles: dict | None
+) -> dict:
+    """
+    item_precomputed row for one item, computed as the detail view would;
+    quantiles is its compute_eta_quantiles() result.
+    """
+    est = compute_estimation(item, checkpoints)
+    completed = [cp for cp in checkpoints if cp.get("status", "completed") == "completed"]
+    cutoff = len(completed) - CHART_NOTE_ROWS
+    completed = [
+        cp if i >= cutoff else {**cp, "notes": None} for i, cp in enumerate(completed)
+    ]
+    return {
+        "item_id": item["id"],
+        "revision": revision,
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "estimation": encode_estimation(est),
+        "eta_quantiles": encode_estimation(quantiles),
+        "chart": chart_to_json(build_progress_chart(item, completed, est, quantiles)),
+    }
+
+
+def precompute(items: list[dict], revisions: dict[str, int]) -> int:
+    """
+    Recompute and store results for items in batches of BATCH_SIZE.
+    revisions must have been read before the items, so a write that lands
+    during the pass leaves a newer revision behind and is picked up next poll.
+    """
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        cps = get_all_checkpoints_for_items([i["id"] for i in batch], columns=FULL_COLUMNS)
+        quantiles = compute_eta_quantiles_many([(item, cps[item["id"]]) for item in batch])
+        save_precomputed([
+            precompute_row(item, cps[item["id"]], revisions.get(f"item:{item['id']}", 0), q)
+            for item, q in zip(batch, quantiles)
+        ])
+    return len(items)
+
+
+def run_once(shard: int, shards: int, done: dict[str, int], refresh: bool) -> int:
+    """
+    One poll: recompute owned items whose revision moved (and with refresh,
+    every owned active item). Updates done in place; returns items written.
+    """
+    revisions = get_revisions()
+    if revisions is None:
+        raise RuntimeError("data_revisions is unavailable (migrations/002_data_revisions.sql)")
+
+    item_revisions = {
+        scope.removeprefix("item:"): revision
+        for scope, revision in revisions.items()
+        if scope.startswith("item:")
+    }
+    for item_id in done.keys() - item_revisions.keys():
+        # Deleted items lose their data_revisions row (migration 007)
+        del done[item_id]
+    changed = {
+        item_id
+        for item_id, revision in item_revisions.items()
+        if owns(item_id, shard, shards) and done.get(item_id) != revision
+    }
+    if not changed and not refresh:
+        return 0
+
+    def due(item: dict) -> bool:
+        if item["id"] in changed:
+            return True
+        if not refresh:
+            return False
+        stale = done.get(item["id"]) != item_revisions.get(item["id"], 0)
+        return item["status"] == "active" or stale
+
+    todo = [i for i in get_items() if owns(i["id"], shard, shards) and due(i)]
+    written = precompute(todo, revisions)
+    for item_id in changed:
+        # Includes items deleted since get_revisions(), so they aren't retried every poll
+        done[item_id] = item_revisions[item_id]
+    for item in todo:
+        done[item["id"]] = item_revisions.get(item["id"], 0)
+    return written
+
+
+def run(shard: int = 0, shards: int = 1, once: bool = False):
+    """Poll forever (or one scheduled pass with once)."""
+    done = {
+        item_id: revision
+        for item_id, revision in get_precomputed_revisions().items()
+        if owns(item_id, shard, shards)
+    }
+    last_refresh = float("-inf")
+    while True:
+        started = time.monotonic()
+        refresh = started - last_refresh >= REFRESH_SECONDS
+        try:
+            written = run_once(shard, shards, done, refresh)
+        except Exception as e:
+            if once:
+                raise
+            print(f"error: {e}", file=sys.stderr)
+        else:
+            if refresh:
+                last_refresh = started
+            if written:
+                print(
+                    f"{'refresh' if refresh else 'changes'}: shard={shard}/{shards} "
+                    f"items={written} seconds={time.monotonic() - started:.1f}",
+                    file=sys.stderr,
+                )
+        if once:
+            return
+        time.sleep(POLL_SECONDS)
+
+
+def main():
+    from cli import load_config
+
+    parser = argparse.ArgumentParser(description="Precompute estimations and charts.")
+    parser.add_argument("--shard", type=int, default=0, help="This worker's shard (0-based)")
+    parser.add_argument("--shards", type=int, default=1, help="Total number of workers")
+    parser.add_argument("--once", action="store_true", help="One scheduled pass, then exit")
+    parser.add_argument("--config", help="TOML file with SUPABASE_URL / SUPABASE_KEY")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be in [0, --shards)")
+
+    load_config(args.config)
+    run(args.shard, args.shards, args.once)
+
+
+if __name__ == "__main__":
+    main()